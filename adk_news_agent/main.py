@@ -6,6 +6,7 @@ from adk_news_agent.agents import create_agents
 from google.adk.runners import Runner
 from google.adk.sessions.in_memory_session_service import InMemorySessionService
 from google.genai import types
+from news_agent.telemetry import record_usage, write_report
 
 async def run_agent():
     print("Iniciando agente...")
@@ -26,6 +27,7 @@ async def run_agent():
     )
     
     print("Enviando mensaje al agente...")
+    final_text = ""
     # Send message and handle events
     async for event in runner.run_async(
         user_id="test_user",
@@ -35,14 +37,31 @@ async def run_agent():
             parts=[types.Part(text="Genera el resumen de noticias de hoy.")]
         )
     ):
-        # ADK events can be different types, we are interested in the final response or intermediate steps
-        # For now, let's print the event to see what we get
-        print(f"Evento: {event}")
-        # If event has a text attribute, it might be the response
-        if hasattr(event, 'text'):
-            print(f"Texto: {event.text}")
+        # Una línea por evento (sin volcar el objeto completo ni las thought signatures)
+        record_usage(event, getattr(event, "model_version", None))
+        logging.info(f"Evento: {describe_event(event)}")
+        if event.is_final_response() and event.content and event.content.parts:
+            final_text = "".join(part.text or "" for part in event.content.parts) or final_text
     
-    return "Ejecución completada"
+    return final_text or "Ejecución completada"
+
+def describe_event(event, max_text=120):
+    """Resumen compacto de un evento ADK: autor, llamadas a herramientas, texto y tokens."""
+    items = []
+    for part in (event.content.parts if event.content and event.content.parts else []):
+        if part.function_call:
+            items.append(f"llamada {part.function_call.name}({', '.join(sorted((part.function_call.args or {}).keys()))})")
+        elif part.function_response:
+            items.append(f"respuesta {part.function_response.name}")
+        elif part.text and not part.thought:
+            text = " ".join(part.text.split())
+            items.append(repr(text[:max_text] + ("…" if len(text) > max_text else "")))
+    if event.error_message:
+        items.append(f"error {event.error_code}: {event.error_message}")
+    usage = event.usage_metadata
+    if usage and usage.total_token_count:
+        items.append(f"{usage.total_token_count} tokens")
+    return f"[{event.author}] " + ("; ".join(items) or "(sin contenido)")
 
 def main():
     # Load environment variables
@@ -67,6 +86,8 @@ def main():
         # In a real scenario, we might want to print the stack trace
         import traceback
         traceback.print_exc()
+    finally:
+        write_report()
 
 if __name__ == "__main__":
     main()
@@ -1,21 +1,109 @@
+import argparse
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta
+
+import pytz
 from google.cloud import firestore
 
 PROJECT_ID = os.environ.get("GOOGLE_CLOUD_PROJECT", "autonomous-agent-479317")
-COLLECTION_NAME = "news_agent_memory_topics"
+BASE_COLLECTION = "news_agent_memory"
+COLLECTION_NAME = f"{BASE_COLLECTION}_topics"
+# Firestore allows at most 500 writes per batch commit
+MAX_BATCH_SIZE = 500
 
-def reset_memory():
-    print(f"🗑️ Clearing Firestore collection: {COLLECTION_NAME} in project {PROJECT_ID}")
-    db = firestore.Client(project=PROJECT_ID)
-    collection_ref = db.collection(COLLECTION_NAME)
-    docs = collection_ref.stream()
-    
+def iter_pages(collection_ref, page_size, cutoff=None):
+    """Yields pages of document references, optionally only those older than 'cutoff'."""
+    if cutoff is not None:
+        query = collection_ref.where("timestamp", "<", cutoff).order_by("timestamp").select(["timestamp"])
+    else:
+        query = collection_ref.order_by("__name__").select([])
+
+    last_doc = None
+    while True:
+        page_query = query.limit(page_size)
+        if last_doc is not None:
+            page_query = page_query.start_after(last_doc)
+        docs = list(page_query.stream())
+        if not docs:
+            return
+        yield [doc.reference for doc in docs]
+        if len(docs) < page_size:
+            return
+        last_doc = docs[-1]
+
+def delete_batch(db, refs):
+    batch = db.batch()
+    for ref in refs:
+        batch.delete(ref)
+    batch.commit()
+    return len(refs)
+
+def purge_collection(db, collection_name, older_than_days=None, dry_run=False, batch_size=MAX_BATCH_SIZE, workers=4):
+    """
+    Deletes documents of a collection in paginated batches of up to 'batch_size',
+    committing several batches concurrently. Returns the number of documents
+    deleted (or that would be deleted in dry-run mode).
+    """
+    batch_size = min(batch_size, MAX_BATCH_SIZE)
+    cutoff = None
+    if older_than_days is not None:
+        cutoff = datetime.now(pytz.utc) - timedelta(days=older_than_days)
+
+    label = f"older than {older_than_days} days" if cutoff else "all documents"
+    print(f"🗑️ {'[dry-run] ' if dry_run else ''}Purging {collection_name} ({label}) in project {PROJECT_ID}")
+
+    start = time.monotonic()
+    collection_ref = db.collection(collection_name)
     deleted = 0
-    for doc in docs:
-        doc.reference.delete()
-        deleted += 1
-        
-    print(f"✅ Deleted {deleted} documents.")
+
+    if dry_run:
+        for refs in iter_pages(collection_ref, batch_size, cutoff):
+            deleted += len(refs)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+            for refs in iter_pages(collection_ref, batch_size, cutoff):
+                pending.add(executor.submit(delete_batch, db, refs))
+                # Keep a bounded number of commits in flight
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    deleted += sum(f.result() for f in done)
+            deleted += sum(f.result() for f in pending)
+
+    elapsed = time.monotonic() - start
+    rate = deleted / elapsed if elapsed > 0 else 0.0
+    verb = "Would delete" if dry_run else "Deleted"
+    print(f"✅ {verb} {deleted} documents from {collection_name} in {elapsed:.1f}s ({rate:.0f} docs/s).")
+    return deleted
+
+def reset_memory(collections=("topics",), older_than_days=None, dry_run=False, batch_size=MAX_BATCH_SIZE, workers=4, base_collection=BASE_COLLECTION):
+    """Purges the summaries and/or topics collections of the agent's memory."""
+    db = firestore.Client(project=PROJECT_ID)
+    names = {
+        "summaries": base_collection,
+        "topics": f"{base_collection}_topics",
+    }
+    total = 0
+    for collection in collections:
+        total += purge_collection(db, names[collection], older_than_days, dry_run, batch_size, workers)
+    return total
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Purge the news agent memory stored in Firestore.")
+    parser.add_argument("--collection", choices=["topics", "summaries", "all"], default="topics",
+                        help="Which collection to purge (default: topics).")
+    parser.add_argument("--older-than-days", type=float, default=None,
+                        help="Only delete documents whose timestamp is older than this many days.")
+    parser.add_argument("--dry-run", action="store_true", help="Count matching documents without deleting them.")
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH_SIZE, help="Documents per batch commit (max 500).")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent batch commits.")
+    parser.add_argument("--base-collection", default=BASE_COLLECTION, help="Memory namespace (NewsMemory collection_name).")
+    args = parser.parse_args(argv)
+
+    collections = ("summaries", "topics") if args.collection == "all" else (args.collection,)
+    reset_memory(collections, args.older_than_days, args.dry_run, args.batch_size, args.workers, args.base_collection)
 
 if __name__ == "__main__":
-    reset_memory()
+    main()
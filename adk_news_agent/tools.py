@@ -1,39 +1,53 @@
 import os
 import logging
 from typing import List, Optional, Dict, Any
-from news_agent.search import search_news as legacy_search_news
-from news_agent.scraper import extract_content as legacy_extract_content
-from news_agent.mailer import send_email as legacy_send_email
-from news_agent.memory import NewsMemory
-from news_agent.reasoning import NewsReasoning
-import requests
-# Initialize components (assuming env vars are set)
-api_key = os.environ.get("GOOGLE_API_KEY")
-memory = NewsMemory(api_key=api_key) if api_key else None
-reasoning = NewsReasoning(api_key=api_key) if api_key else None
+from news_agent import providers
+from news_agent.telemetry import span, traced
+# The clients and the heavier modules (Firestore, GenAI, DuckDuckGo, bs4, requests, numpy)
+# are loaded by the first tool that needs them, so importing the tools stays cheap.
 
+def _memory():
+    """Shared NewsMemory, built on first use (None without GOOGLE_API_KEY)."""
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    return providers.get_memory(api_key=api_key) if api_key else None
+
+def _reasoning():
+    """Shared NewsReasoning, built on first use (None without GOOGLE_API_KEY)."""
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    return providers.get_reasoning(api_key=api_key) if api_key else None
+
+@traced("tool.get_past_summaries", as_stage=True)
 def get_past_summaries(days: int = 3) -> str:
     """Retrieves summaries of news from past days to avoid duplicates."""
+    memory = _memory()
     if not memory:
         return "No memory component available."
-    summaries = memory.get_recent_summaries(days=days)
-    return str(summaries)
+    digest = memory.get_topic_digest(days=days)
+    return f"Topics covered in the last {days} days:\n{digest}" if digest else f"No summaries in the last {days} days."
 
+@traced("tool.search_news", as_stage=True)
 def search_news(query: str) -> List[Dict[str, str]]:
     """Searches for news articles based on a query."""
+    from news_agent.dedup import Deduplicator
+    from news_agent.search import search_news as legacy_search_news
     # Try grounded search first if reasoning is available
-    if reasoning:
-        results = reasoning.grounded_search([query])
-        if results:
-            return results
-    # Fallback to legacy search
-    return legacy_search_news(query)
+    reasoning = _reasoning()
+    results = reasoning.grounded_search([query]) if reasoning else []
+    if not results:
+        # Fallback to legacy search
+        results = legacy_search_news(query)
+    # Syndicated copies and tracking-parameter variants of the same story are returned once
+    return Deduplicator().dedupe(results)
 
+@traced("tool.scrape_content", as_stage=True)
 def scrape_content(url: str) -> str:
     """Extracts text content from a given URL."""
+    from news_agent.scraper import extract_content as legacy_extract_content
     content = legacy_extract_content(url) or ""
     # Truncate content to avoid context overflow (approx 5000 chars)
     return content[:5000] + "... (truncated)" if len(content) > 5000 else content
+
+@traced("tool.get_google_trends", as_stage=True)
 def get_google_trends(region: str = 'US', limit: int = 5) -> str:
     """Gets top trending terms related to 'cuba' from Google Trends using SerpApi.
     Args:
@@ -46,6 +60,7 @@ def get_google_trends(region: str = 'US', limit: int = 5) -> str:
     api_key = os.environ.get("CUBA_NEWS_SERPAPI_KEY")
     if not api_key:
         return "Error: CUBA_NEWS_SERPAPI_KEY not set."
+    import requests
 
     try:
         # SerpApi Google Trends parameters
@@ -56,7 +71,8 @@ def get_google_trends(region: str = 'US', limit: int = 5) -> str:
             "api_key": api_key
         }
         
-        response = requests.get("https://serpapi.com/search", params=params)
+        with span("http.get"):
+            response = requests.get("https://serpapi.com/search", params=params)
         data = response.json()
         
         if "error" in data:
@@ -89,23 +105,23 @@ def get_google_trends(region: str = 'US', limit: int = 5) -> str:
         logging.error(f"SerpApi Google Trends failed: {str(e)}")
         return f"Error fetching Google Trends via SerpApi: {str(e)}"
 
+@traced("tool.get_economic_indicators", as_stage=True)
 def get_economic_indicators() -> str:
-    """Gets current economic indicators for Cuba."""
-    # Try Marti
-    text = legacy_extract_content("https://www.martinoticias.com/tasa-de-cambio-de-moneda-cuba-hoy")
-    if text and ("USD" in text or "EUR" in text):
-        return text
-    
-    # Try El Toque
-    text = legacy_extract_content("https://eltoque.com/tasas-de-cambio-de-moneda-en-cuba-hoy")
-    if text and ("USD" in text or "EUR" in text):
-        return text
-    
-    # Try CambioCuba (simplified for tool output, might need OCR or just URL)
-    return "Check https://wa.cambiocuba.money/trmi.png for latest rates."
+    """Gets current economic indicators (informal market exchange rates) for Cuba."""
+    from news_agent.indicators import format_rates, get_economic_indicators as fetch_economic_indicators
+    from news_agent.rates_store import record_rates
+    record = fetch_economic_indicators()
+    if not record:
+        return "Check https://wa.cambiocuba.money/trmi.png for latest rates."
+    trends = record_rates(record)
+    if trends:
+        return f"{format_rates(record)}\nRate trend (last days):\n{trends}"
+    return format_rates(record)
 
+@traced("tool.send_email", as_stage=True)
 def send_email(subject: str, body: str, to_email: Optional[str] = None, bcc_emails: Optional[List[str]] = None) -> str:
     """Sends an email with the given subject and body. If to_email is not provided, uses GMAIL_USER."""
+    from news_agent.mailer import send_email as legacy_send_email
     user_email = os.environ.get("GMAIL_USER")
     password = os.environ.get("GMAIL_PASSWORD")
     
@@ -123,9 +139,13 @@ def send_email(subject: str, body: str, to_email: Optional[str] = None, bcc_emai
     success = legacy_send_email(user_email, password, subject, body, to_email=recipient, bcc_emails=bcc_emails, is_html=True)
     return "Email sent successfully." if success else "Failed to send email."
 
+@traced("tool.save_summary", as_stage=True)
 def save_summary(topics: List[str], summary: str, news_hash: str) -> str:
     """Saves the generated summary to memory."""
+    memory = _memory()
     if not memory:
         return "No memory component available."
-    memory.save_summary(topics, summary, news_hash)
-    return "Summary saved to memory."
+    result = memory.save_summary(topics, summary, news_hash)
+    if not result:
+        return "Failed to save summary to memory."
+    return f"Summary saved to memory (id: {result['summary_id']}, {len(result['topic_ids'])} topics)."
@@ -0,0 +1,71 @@
+"""
+Checks that every extraction backend reproduces the BeautifulSoup output on the
+saved fixtures and measures their throughput.
+
+    python -m benchmarks.bench_extract [--repeat 50] [--scale 20]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+from news_agent.extractors import BACKENDS, extract_text
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def load_fixtures():
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            fixtures[os.path.basename(path)] = f.read()
+    return fixtures
+
+def check_equivalence(fixtures):
+    ok = True
+    for name, html in fixtures.items():
+        reference = extract_text(html, backend="bs4")
+        for backend in BACKENDS[1:]:
+            if extract_text(html, backend=backend) != reference:
+                print(f"❌ {backend} differs from bs4 on {name}")
+                ok = False
+    return ok
+
+def bench(html, backend, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        extract_text(html, backend=backend)
+    return time.perf_counter() - start
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50, help="Extractions per backend and page.")
+    parser.add_argument("--scale", type=int, default=20, help="Times the article body is repeated to build a large page.")
+    args = parser.parse_args(argv)
+
+    fixtures = load_fixtures()
+    if not check_equivalence(fixtures):
+        return 1
+    print(f"✅ All backends produce identical output on {len(fixtures)} fixtures.")
+
+    # A large page: the article fixture with its body repeated
+    article = fixtures["news_article.html"]
+    head, _, tail = article.partition("<main")
+    fixtures["large_page (synthetic)"] = head + ("<main" + tail.split("</main>")[0] + "</main>") * args.scale + "</body></html>"
+
+    print(f"\n{'page':<26}{'KiB':>8}" + "".join(f"{b + ' MB/s':>14}" for b in BACKENDS) + f"{'main MB/s':>14}")
+    for name, html in fixtures.items():
+        size_mb = len(html.encode("utf-8")) / 1e6
+        row = f"{name:<26}{size_mb * 1000 / 1.024:>8.1f}"
+        for backend in BACKENDS:
+            elapsed = bench(html, backend, args.repeat)
+            row += f"{size_mb * args.repeat / elapsed:>14.1f}"
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            extract_text(html, main_content=True)
+        row += f"{size_mb * args.repeat / (time.perf_counter() - start):>14.1f}"
+        print(row)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Measures the cold import time of the entry-point modules (what a Cloud Run Job pays
+before doing any work), each in a fresh interpreter with -X importtime.
+
+    python -m benchmarks.bench_import [--repeat 5] [--top 8] [module ...]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+DEFAULT_MODULES = ["adk_news_agent.tools", "news_agent.reasoning", "news_agent.memory", "main"]
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def import_profile(module):
+    """Imports 'module' in a new interpreter. Returns (wall seconds, {module: cumulative µs})."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    wall = time.perf_counter() - start
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        if cumulative_us.strip().isdigit():
+            cumulative[name.strip()] = int(cumulative_us)
+    return wall, cumulative
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module.")
+    parser.add_argument("--top", type=int, default=8, help="Slowest top-level imports to list per module.")
+    args = parser.parse_args(argv)
+
+    baseline = statistics.median(import_profile("sys")[0] for _ in range(args.repeat))
+    print(f"Interpreter start-up: {baseline * 1000:.0f} ms\n")
+    print(f"{'module':<26}{'import ms':>12}{'wall ms':>12}")
+    profiles = {}
+    for module in args.modules:
+        runs = [import_profile(module) for _ in range(args.repeat)]
+        import_ms = statistics.median(profile[module] for _, profile in runs if module in profile) / 1000
+        wall_ms = statistics.median(wall for wall, _ in runs) * 1000
+        profiles[module] = runs[-1][1]
+        print(f"{module:<26}{import_ms:>12.1f}{wall_ms:>12.1f}")
+
+    for module, profile in profiles.items():
+        # Largest subtrees first, skipping the module itself, its parents and nested entries
+        heaviest = []
+        for us, name in sorted(((us, name) for name, us in profile.items()), reverse=True):
+            if module == name or module.startswith(name + ".") or name in ("site", "encodings"):
+                continue
+            if not any(name.startswith(picked + ".") for _, picked in heaviest):
+                heaviest.append((us, name))
+            if len(heaviest) == args.top:
+                break
+        print(f"\nHeaviest imports of {module}:")
+        for us, name in heaviest:
+            print(f"  {name:<32}{us / 1000:>10.1f} ms")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
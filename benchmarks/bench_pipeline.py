@@ -0,0 +1,184 @@
+"""
+Runs the daily pipeline of main.py end to end against local fakes (GenAI, Firestore,
+news sites, SMTP) and reports per-stage latency, throughput and peak memory.
+
+    python -m benchmarks.bench_pipeline [--days 5] [--latency 0.2] [--site-latency 0.05] [--json out.json]
+
+With --editions N every day produces N newsletter editions from one shared research pass.
+With --incremental --runs-per-day N each day is run N times in incremental mode; the
+runs after the first only find news that was already seen.
+
+Set FIRESTORE_EMULATOR_HOST and pass --firestore emulator to use the Firestore emulator
+instead of the in-memory stand-in.
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from urllib.parse import urlparse
+
+from benchmarks.fakes import FakeGenAIClient, InMemoryFirestore, NewsSite, SmtpSink, load_recorded
+
+
+def make_grounding_urls(site, recorded, client, per_query):
+    """Maps each grounded query to 'per_query' recorded article URLs rewritten to the local site."""
+    urls = recorded["urls"] or [f"https://example.com/noticia-{n}" for n in range(50)]
+
+    def grounding_urls(query):
+        offset = (zlib.crc32(query.encode("utf-8")) + client.day * per_query) % len(urls)
+        picked = [urls[(offset + n) % len(urls)] for n in range(per_query)]
+        return [site.url(f"/d{client.day}/{urlparse(url).netloc}{urlparse(url).path}") for url in picked]
+    return grounding_urls
+
+
+def summarize(samples):
+    return {
+        "mean": round(statistics.fmean(samples), 3),
+        "p50": round(statistics.median(samples), 3),
+        "max": round(max(samples), 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, default=5, help="Simulated daily runs.")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per GenAI call.")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Seconds per embedding call.")
+    parser.add_argument("--site-latency", type=float, default=0.05, help="Seconds per page served by the news site.")
+    parser.add_argument("--urls-per-query", type=int, default=5, help="Articles returned by each grounded search.")
+    parser.add_argument("--editions", type=int, default=1, help="Editions per day (news_agent.editions).")
+    parser.add_argument("--incremental", action="store_true", help="Skip already seen news (news_agent.seen_store).")
+    parser.add_argument("--runs-per-day", type=int, default=1, help="Runs per simulated day.")
+    parser.add_argument("--firestore", choices=("memory", "emulator"), default="memory")
+    parser.add_argument("--json", help="Also write the report to this file.")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline logs.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR,
+                        format="%(asctime)s - %(levelname)s - %(message)s")
+
+    # Caches and the rate history go to a scratch directory; every run starts cold
+    scratch = tempfile.mkdtemp(prefix="news_agent_bench_")
+    os.environ["NEWS_AGENT_CACHE_DIR"] = os.path.join(scratch, "cache")
+    os.environ["NEWS_AGENT_DATA_DIR"] = os.path.join(scratch, "data")
+    os.environ["NEWS_AGENT_LLM_CACHE"] = "off"
+
+    # Imported after the environment is set
+    import main as pipeline
+    from news_agent.editions import Edition, deliver_editions
+    from news_agent.indicators import TextRateSource, get_economic_indicators
+    from news_agent.memory import NewsMemory
+    from news_agent.reasoning import NewsReasoning
+    from news_agent.seen_store import LocalSeenStore
+    from news_agent.telemetry import TracedGenAIClient, telemetry
+
+    site = NewsSite(latency=args.site_latency)
+    sink = SmtpSink()
+    os.environ.update({"SMTP_HOST": sink.host, "SMTP_PORT": str(sink.port), "SMTP_STARTTLS": "false",
+                       "MAIL_RATE_PER_MINUTE": "0"})
+
+    recorded = load_recorded()
+    client = FakeGenAIClient(recorded=recorded, latency=args.latency, embed_latency=args.embed_latency)
+    client.grounding_urls = make_grounding_urls(site, recorded, client, args.urls_per_query)
+    if args.firestore == "emulator":
+        from google.cloud import firestore
+        db = firestore.Client(project=os.environ.get("GOOGLE_CLOUD_PROJECT", "news-agent-bench"))
+    else:
+        db = InMemoryFirestore()
+
+    # Traced like the real client, so the report includes the per-stage call spans
+    traced_client = TracedGenAIClient(client)
+    memory = NewsMemory(collection_name=f"bench_{int(time.time())}", db=db, genai_client=traced_client)
+    reasoning = NewsReasoning(model_name="fake-model", client=traced_client)
+    rate_sources = [TextRateSource("Local", site.url("/rates"), 0)]
+    editions = [Edition(f"e{n}", subject=f"Edición {n}", collection=f"{memory.collection_name}_e{n}",
+                        instructions=f"Edición {n}.", recipients=["a@example.com"])
+                for n in range(args.editions)]
+
+    def collect_indicators():
+        return get_economic_indicators(sources=rate_sources, ttl=0)
+
+    seen = LocalSeenStore() if args.incremental else None
+    min_articles = int(os.environ.get("INCREMENTAL_MIN_ARTICLES", "3")) if args.incremental else 0
+
+    per_stage = {}
+    day_times = []
+    articles = 0
+    telemetry.reset()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        for day, _ in [(day, run) for day in range(args.days) for run in range(args.runs_per_day)]:
+            client.day = day
+            timings = {}
+            day_start = time.perf_counter()
+            if args.editions > 1:
+                results, memories, articles_data = pipeline.build_editions(
+                    memory, reasoning, editions, timings, collect_indicators=collect_indicators,
+                    seen=seen, min_articles=min_articles)
+                if results is not None:
+                    with pipeline.timed(timings, "deliver"):
+                        deliver_editions(editions, results, memories, pipeline.generate_hash(articles_data),
+                                         "bench@example.com", "secret", articles_data=articles_data, seen=seen)
+            else:
+                summary, topics, articles_data = pipeline.build_newsletter(
+                    memory, reasoning, timings, collect_indicators=collect_indicators,
+                    seen=seen, min_articles=min_articles)
+                if summary is not None:
+                    with pipeline.timed(timings, "deliver"):
+                        pipeline.deliver_newsletter(memory, summary, topics, articles_data, "bench@example.com",
+                                                    "secret", bcc_emails=["a@example.com"], seen=seen)
+            day_times.append(time.perf_counter() - day_start)
+            articles += len(articles_data)
+            for stage, seconds in timings.items():
+                per_stage.setdefault(stage, []).append(seconds)
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        site.close()
+        sink.close()
+
+    report = {
+        "days": args.days,
+        "latency": {"genai": args.latency, "embed": args.embed_latency, "site": args.site_latency},
+        "stages": {stage: summarize(samples) for stage, samples in per_stage.items()},
+        "day": summarize(day_times),
+        "throughput": {
+            "days_per_min": round(args.days * 60 / elapsed, 2),
+            "articles_per_s": round(articles / elapsed, 2),
+        },
+        "articles": articles,
+        "genai_calls": client.calls,
+        "pages_served": site.requests,
+        "emails": sink.messages,
+        "email_recipients": sink.recipients,
+        "peak_memory_mib": round(peak / 2 ** 20, 2),
+        "telemetry": telemetry.report(),
+    }
+
+    print(f"{'stage':<22}{'mean s':>10}{'p50 s':>10}{'max s':>10}")
+    for stage, stats in list(report["stages"].items()) + [("(whole day)", report["day"])]:
+        print(f"{stage:<22}{stats['mean']:>10.3f}{stats['p50']:>10.3f}{stats['max']:>10.3f}")
+    print(f"\n{args.days} days in {elapsed:.2f}s: {report['throughput']['days_per_min']} days/min, "
+          f"{articles} articles ({report['throughput']['articles_per_s']}/s)")
+    print(f"GenAI calls: {client.calls}, pages served: {site.requests}, emails: {sink.messages}")
+    print(f"Peak traced memory: {report['peak_memory_mib']} MiB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    # Two recipients per edition and bulletin (sender and one more address); incremental
+    # runs only send when there is enough new material
+    expected = 2 * args.editions * args.days
+    return 0 if sink.recipients == expected or (args.incremental and 0 < sink.recipients <= expected) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,431 @@
+"""
+Local stand-ins for the external services used by the pipeline, for offline benchmarks:
+- FakeGenAIClient: GenAI client that answers with responses recorded in agent_output.txt
+  (grounded searches include grounding_metadata).
+- InMemoryFirestore: the subset of the Firestore client used by NewsMemory.
+- NewsSite: HTTP server with the saved news and exchange-rate pages.
+- SmtpSink: SMTP server that accepts and discards every message.
+"""
+import hashlib
+import json
+import os
+import re
+import socketserver
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from google.genai import types
+
+from news_agent.embedding_cache import normalize_text
+
+BENCH_DIR = os.path.dirname(__file__)
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+RECORDED_OUTPUT = os.path.join(os.path.dirname(BENCH_DIR), "agent_output.txt")
+
+DEFAULT_TOPICS = ["Crisis Energética", "Crisis Sanitaria", "Inversión Extranjera", "Economía", "Migración"]
+
+# --- Recorded responses ---
+
+def _unescape(html):
+    # The recorded events are Python reprs: nested strings keep their escapes
+    return html.replace("\\\\n", "\n").replace("\\n", "\n").replace("\\'", "'").replace('\\"', '"')
+
+def load_recorded(path=RECORDED_OUTPUT):
+    """
+    Newsletters, topic lists and source URLs recorded in an agent run log.
+    Returns {"summaries": [...], "topics": [[...], ...], "urls": [...]}.
+    """
+    recorded = {"summaries": [], "topics": [], "urls": []}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        recorded["summaries"] = [_unescape(html) for html in re.findall(r"<!DOCTYPE html>.*?</html>", text, re.S)]
+        for topics in re.findall(r"'topics(?:_covered)?': \[([^\]]*)\]", text):
+            names = re.findall(r"'([^']+)'", topics)
+            if names:
+                recorded["topics"].append(names)
+        urls = {url.rstrip("',.):\\") for url in re.findall(r"https?://[^\s<>\"'\\]+", text)}
+        recorded["urls"] = sorted(url for url in urls if url.count("/") > 3)
+    if not recorded["summaries"]:
+        recorded["summaries"] = ["<html><body><h1>🇨🇺 Resumen Diario de Cuba</h1><p>Sin novedades.</p></body></html>"]
+    if not recorded["topics"]:
+        recorded["topics"] = [DEFAULT_TOPICS]
+    return recorded
+
+# --- GenAI ---
+
+def _text_response(text, prompt_tokens=0):
+    return types.GenerateContentResponse(
+        candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part(text=text)]))],
+        usage_metadata=types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=len(text) // 4,
+            total_token_count=prompt_tokens + len(text) // 4,
+        ),
+    )
+
+def _prompt_text(contents):
+    if isinstance(contents, str):
+        return contents
+    return "\n".join(part for part in contents if isinstance(part, str))
+
+def fake_embedding(text, dimension=768):
+    """Deterministic unit vector for a text (same normalized text, same vector)."""
+    seed = int.from_bytes(hashlib.sha256(normalize_text(text).encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+def _source_domain(url):
+    # NewsSite URLs embed the original domain: http://127.0.0.1:port/d0/<domain>/<path>
+    return next((part for part in url.split("/")[3:] if "." in part), url.split("/")[2])
+
+class _FakeModels:
+    def __init__(self, client):
+        self._client = client
+
+    def _wait(self, latency=None):
+        delay = self._client.latency if latency is None else latency
+        if delay:
+            time.sleep(delay)
+
+    def _grounded(self, contents):
+        """Grounded search: the source URLs as text plus grounding_metadata, like Gemini."""
+        query = _prompt_text(contents).split("sobre:", 1)[-1].split(".", 1)[0].strip()
+        urls = self._client.grounding_urls(query) if self._client.grounding_urls else []
+        response = _text_response("Fuentes encontradas:\n" + "\n".join(f"- {url}" for url in urls))
+        # Gemini titles each source with its domain; every source backs one sentence of the answer
+        response.candidates[0].grounding_metadata = types.GroundingMetadata(
+            grounding_chunks=[types.GroundingChunk(web=types.GroundingChunkWeb(uri=url, title=_source_domain(url)))
+                              for url in urls],
+            grounding_supports=[
+                types.GroundingSupport(
+                    segment=types.Segment(text=f"{query}: {url.rstrip('/').rsplit('/', 1)[-1].replace('-', ' ')}."),
+                    grounding_chunk_indices=[n], confidence_scores=[round(1.0 - n / (2 * len(urls)), 3)])
+                for n, url in enumerate(urls)
+            ],
+        )
+        return response
+
+    def _answer(self, contents, config):
+        client = self._client
+        prompt = _prompt_text(contents)
+
+        schema = getattr(config, "response_schema", None)
+        name = getattr(schema, "__name__", "")
+        day = client.day
+        topics = client.recorded["topics"][day % len(client.recorded["topics"])]
+        if name == "SearchQueries":
+            return json.dumps({"queries": [f"{topic} Cuba hoy" for topic in topics[:3]]}, ensure_ascii=False)
+        if name == "RedundancyVerdicts":
+            count = len(re.findall(r"--- Noticia \d+ ---", prompt))
+            # Every third doubtful article is a repeat
+            verdicts = [{"id": n, "verdict": "REPETIDA" if n % 3 == 0 else "NUEVA"} for n in range(1, count + 1)]
+            return json.dumps({"verdicts": verdicts})
+        summaries = client.recorded["summaries"]
+        return json.dumps({"summary_html": summaries[day % len(summaries)], "topics": topics}, ensure_ascii=False)
+
+    def generate_content(self, *, model, contents, config=None, **kwargs):
+        self._wait()
+        self._client.calls += 1
+        tools = config.get("tools") if isinstance(config, dict) else getattr(config, "tools", None)
+        if tools:
+            return self._grounded(contents)
+        return _text_response(self._answer(contents, config), prompt_tokens=len(_prompt_text(contents)) // 4)
+
+    def generate_content_stream(self, *, model, contents, config=None, **kwargs):
+        self._wait()
+        self._client.calls += 1
+        text = self._answer(contents, config)
+        size = self._client.stream_chunk_chars
+        for start in range(0, len(text), size):
+            if start:
+                self._wait(self._client.chunk_latency)
+            yield _text_response(text[start:start + size])
+
+    def embed_content(self, *, model, contents, config=None, **kwargs):
+        self._wait(self._client.embed_latency)
+        self._client.calls += 1
+        texts = [contents] if isinstance(contents, str) else list(contents)
+        return types.EmbedContentResponse(embeddings=[types.ContentEmbedding(values=fake_embedding(t)) for t in texts])
+
+class FakeGenAIClient:
+    """
+    Replacement for genai.Client. Structured calls (queries, verdicts, summary) are
+    answered from the recorded run; grounded searches return 'grounding_urls(query)'.
+    Every call sleeps 'latency' seconds (embeddings 'embed_latency', stream chunks
+    'chunk_latency') to model the network.
+    """
+
+    def __init__(self, recorded=None, grounding_urls=None, latency=0.0, embed_latency=None,
+                 chunk_latency=0.0, stream_chunk_chars=512):
+        self.recorded = recorded or load_recorded()
+        self.grounding_urls = grounding_urls
+        self.latency = latency
+        self.embed_latency = latency if embed_latency is None else embed_latency
+        self.chunk_latency = chunk_latency
+        self.stream_chunk_chars = stream_chunk_chars
+        self.calls = 0
+        # Simulated day: selects which recorded newsletter and topics are returned
+        self.day = 0
+        self.models = _FakeModels(self)
+
+# --- Firestore ---
+
+class _Snapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+class _DocumentRef:
+    def __init__(self, collection, doc_id):
+        self._collection = collection
+        self.id = doc_id
+
+    def set(self, data):
+        self._collection._docs[self.id] = dict(data)
+
+    def delete(self):
+        self._collection._docs.pop(self.id, None)
+
+_OPERATORS = {
+    "==": lambda a, b: a == b, "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b, "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b, ">=": lambda a, b: a >= b,
+}
+
+class _Query:
+    def __init__(self, collection, filters=(), order=None, fields=None, max_results=None, nearest=None):
+        self._collection = collection
+        self._filters = list(filters)
+        self._order = order
+        self._fields = fields
+        self._limit = max_results
+        self._nearest = nearest
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, order=self._order, fields=self._fields,
+                     max_results=self._limit, nearest=self._nearest)
+        state.update(changes)
+        return _Query(self._collection, **state)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + [(field, _OPERATORS[op], value)])
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._copy(order=(field, direction == "DESCENDING"))
+
+    def select(self, fields):
+        return self._copy(fields=list(fields))
+
+    def limit(self, count):
+        return self._copy(max_results=count)
+
+    def find_nearest(self, vector_field, query_vector, distance_measure, limit,
+                     distance_result_field=None, distance_threshold=None):
+        return self._copy(nearest=(vector_field, list(query_vector), distance_result_field, distance_threshold),
+                          max_results=limit)
+
+    def stream(self):
+        with self._collection._lock:
+            docs = [(doc_id, dict(data)) for doc_id, data in self._collection._docs.items()]
+        docs = [(i, d) for i, d in docs if all(f in d and op(d[f], v) for f, op, v in self._filters)]
+        if self._nearest:
+            field, query, result_field, threshold = self._nearest
+            query = np.asarray(query, dtype=np.float64)
+            scored = []
+            for doc_id, data in docs:
+                if data.get(field) is None:
+                    continue
+                vector = np.asarray(list(data[field]), dtype=np.float64)
+                distance = 1 - float(vector @ query / (np.linalg.norm(vector) * np.linalg.norm(query)))
+                if threshold is None or distance <= threshold:
+                    if result_field:
+                        data[result_field] = distance
+                    scored.append((distance, doc_id, data))
+            docs = [(doc_id, data) for _, doc_id, data in sorted(scored, key=lambda item: item[0])]
+        elif self._order:
+            field, descending = self._order
+            docs.sort(key=lambda item: item[1].get(field), reverse=descending)
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        for doc_id, data in docs:
+            if self._fields is not None:
+                data = {f: data[f] for f in self._fields if f in data}
+            yield _Snapshot(doc_id, data)
+
+class _Collection(_Query):
+    def __init__(self, name):
+        self.name = name
+        self._docs = {}
+        self._lock = threading.Lock()
+        super().__init__(self)
+
+    def document(self, doc_id=None):
+        return _DocumentRef(self, doc_id or uuid.uuid4().hex[:20])
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+class _WriteBatch:
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def set(self, ref, data):
+        self._writes.append((ref, dict(data)))
+
+    def delete(self, ref):
+        self._writes.append((ref, None))
+
+    def commit(self):
+        with self._db._lock:
+            for ref, data in self._writes:
+                if data is None:
+                    ref.delete()
+                else:
+                    ref.set(data)
+        self._writes = []
+
+class InMemoryFirestore:
+    """In-process stand-in for firestore.Client with the queries NewsMemory uses."""
+
+    def __init__(self):
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def collection(self, name):
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = _Collection(name)
+            return self._collections[name]
+
+    def batch(self):
+        return _WriteBatch(self)
+
+    def document_count(self):
+        return sum(len(collection._docs) for collection in self._collections.values())
+
+# --- HTTP ---
+
+def _load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+class NewsSite:
+    """
+    Local HTTP server. /rates serves the exchange-rate page and any other path a
+    news article built from the saved fixture, with a title taken from the path.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        article = _load_fixture("news_article.html")
+        rates = _load_fixture("exchange_rates.html")
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.requests += 1
+                if site.latency:
+                    time.sleep(site.latency)
+                if self.path.startswith("/rates"):
+                    body = rates
+                else:
+                    title = self.path.rstrip("/").rsplit("/", 1)[-1].replace("-", " ").capitalize()
+                    body = article.replace("Nuevo apagón masivo deja sin electricidad a gran parte de Cuba", title)
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def url(self, path):
+        return self.base_url + path
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+# --- SMTP ---
+
+class SmtpSink:
+    """
+    Minimal SMTP server (no TLS, any AUTH PLAIN login) that counts the messages it receives.
+    'rcpt_replies' maps an address to replies used (one per RCPT) before accepting it, e.g.
+    {"a@example.com": ["451 4.3.0 Try again later"]} to exercise retries; 'auth_reply'
+    replaces the AUTH reply (e.g. "535 5.7.8 Bad credentials").
+    """
+
+    def __init__(self):
+        self.messages = 0
+        self.recipients = 0
+        self.bytes = 0
+        self.connections = 0
+        self.rcpt_replies = {}
+        self.auth_reply = "235 2.7.0 Authentication successful"
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode("ascii") + b"\r\n")
+
+            def handle(self):
+                sink.connections += 1
+                self.reply("220 localhost SMTP sink")
+                for raw in self.rfile:
+                    command = raw.decode("utf-8", "replace").strip()
+                    verb = command.split(" ", 1)[0].upper()
+                    if verb == "EHLO":
+                        self.wfile.write(b"250-localhost\r\n250 AUTH PLAIN LOGIN\r\n")
+                    elif verb == "AUTH":
+                        self.reply(sink.auth_reply)
+                    elif verb == "RCPT":
+                        address = command.partition(":")[2].strip().strip("<>")
+                        replies = sink.rcpt_replies.get(address)
+                        if replies:
+                            self.reply(replies.pop(0))
+                            continue
+                        sink.recipients += 1
+                        self.reply("250 OK")
+                    elif verb == "DATA":
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        for line in self.rfile:
+                            if line in (b".\r\n", b".\n"):
+                                break
+                            sink.bytes += len(line)
+                        sink.messages += 1
+                        self.reply("250 OK")
+                    elif verb == "QUIT":
+                        self.reply("221 Bye")
+                        break
+                    else:
+                        self.reply("250 OK")
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
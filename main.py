@@ -2,17 +2,336 @@ import logging
 import getpass
 import hashlib
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from news_agent.search import search_news
-from news_agent.scraper import extract_content
-from news_agent.mailer import send_email
+from news_agent.fetcher import ScrapeEngine
+from news_agent.indicators import get_economic_indicators
+from news_agent.rates_store import record_rates
+from news_agent.seen_store import fingerprints_of, open_seen_store
+from news_agent.dedup import Deduplicator
+from news_agent.delivery import DeliveryEngine, SmtpConnectError, open_outbox
+from news_agent.editions import deliver_editions, load_editions, open_memories, summarize_editions
 from news_agent.memory import NewsMemory
-from news_agent.reasoning import NewsReasoning
+from news_agent.reasoning import GROUNDING_CONCURRENCY, NewsReasoning
+from news_agent.llm_cache import cache_stats
+from news_agent.telemetry import write_report
+from news_agent.pipeline import Pipeline, Stage, log_timings, run_concurrently, timed
+
+# Resultados de búsqueda como máximo por llamada de filtrado
+FILTER_BATCH_SIZE = 32
 
 def generate_hash(articles):
     combined = "".join([a.get('title', '') for a in articles])
     return hashlib.sha256(combined.encode('utf-8')).hexdigest()
 
+def collect_economic_data():
+    """Obtiene los indicadores económicos consultando todas las fuentes a la vez."""
+    logging.info("Obteniendo indicadores económicos...")
+    return get_economic_indicators()
+
+def research_articles(memory, reasoning, past_summaries, timings, seen=None):
+    """
+    Genera las queries y pasa las noticias por un pipeline search → filter → scrape.
+    Cada query se busca en paralelo y sus resultados se filtran y se extraen en
+    cuanto llegan, sin esperar al resto de búsquedas. Los duplicados (misma URL
+    canónica, título+snippet o texto casi iguales) se descartan antes de las etapas
+    caras (news_agent.dedup).
+    Con 'seen' (news_agent.seen_store, modo incremental) se descartan las noticias
+    ya vistas antes de filtrarlas o extraerlas, y las redundantes se marcan como vistas.
+    Las pendientes de ejecuciones anteriores se incluyen sin volver a buscarlas ni extraerlas.
+    """
+    # 4. Generate Queries
+    with timed(timings, "queries"):
+        queries = reasoning.generate_search_queries(past_summaries)
+    
+    # 5. Search News
+    logging.info("Buscando noticias...")
+    ranks = {}
+    counts = {"found": 0, "filtered": 0, "seen": 0}
+    lock = threading.Lock()
+    dedup = Deduplicator()
+    pending = seen.pending() if seen is not None else []
+    for rank, res in enumerate(pending):
+        # Van detrás de las de hoy y sus repeticiones se descartan como duplicados
+        ranks[res['url']] = (len(queries), rank)
+        dedup.add_result(res)
+        dedup.add_text(res)
+    
+    def search(indexed_query):
+        index, query = indexed_query
+        results = reasoning.grounded_search([query])
+        if not results:
+            logging.warning(f"Grounding no devolvió resultados para '{query}', intentando búsqueda tradicional...")
+            results = search_news(query)
+        # Orden estable (query, posición) y sin duplicados entre queries
+        new_results = []
+        with lock:
+            for rank, res in enumerate(results):
+                if res.get('url') and dedup.add_result(res):
+                    ranks[res['url']] = (index, rank)
+                    if seen is not None and seen.is_seen(res):
+                        counts["seen"] += 1
+                        continue
+                    new_results.append(res)
+            counts["found"] += len(new_results)
+        return new_results
+    
+    # 6. Filter Redundant Articles (los resultados que se acumulan mientras se filtra
+    # un lote van juntos al siguiente: una llamada de embeddings y otra al LLM por lote)
+    def filter_batch(batch):
+        filtered = reasoning.filter_articles(batch, memory)
+        with lock:
+            counts["filtered"] += len(filtered)
+        if seen is not None:
+            # Las redundantes ya están cubiertas: no se vuelven a evaluar en la próxima ejecución
+            seen.add([res for res in batch if not any(res is kept for kept in filtered)])
+        return filtered
+    
+    # 7. Scrape Content (bounded per domain and by a global deadline from the first scrape)
+    engine = ScrapeEngine(deadline=float(os.environ.get("SCRAPE_DEADLINE", "60")))
+    deadline_at = []
+    
+    def scrape(res):
+        with lock:
+            if not deadline_at:
+                deadline_at.append(time.monotonic() + engine.deadline)
+        text = engine.fetch(res['url'], deadline_at[0])
+        if text:
+            res['text'] = text
+            if not dedup.add_text(res):
+                return []
+            if seen is not None and seen.is_seen(res):
+                # Mismo texto con otra URL
+                with lock:
+                    counts["seen"] += 1
+                return []
+            return [res]
+        return []
+    
+    pipeline = Pipeline([
+        Stage("search", search, workers=max(1, min(len(queries), GROUNDING_CONCURRENCY))),
+        Stage("filter", filter_batch, batch_size=FILTER_BATCH_SIZE),
+        Stage("scrape", scrape, workers=engine.max_workers),
+    ])
+    try:
+        articles_data = pipeline.run(enumerate(queries))
+    finally:
+        engine.close()
+    timings.update(pipeline.timings())
+    articles_data += pending
+    articles_data.sort(key=lambda res: ranks[res['url']])
+    logging.info(f"Duplicados descartados: {dedup.dropped['url']} por URL, {dedup.dropped['snippet']} por título/snippet, "
+                 f"{dedup.dropped['text']} por texto.")
+    if seen is not None:
+        logging.info(f"Modo incremental: {counts['seen']} noticias ya vistas descartadas, "
+                     f"{len(pending)} pendientes de ejecuciones anteriores.")
+    
+    if not counts["found"]:
+        logging.warning("No se encontraron noticias.")
+        # Continue to allow economic indicators and analysis
+    elif not counts["filtered"]:
+        logging.warning("Todas las noticias encontradas eran redundantes.")
+        # Continue to allow economic indicators and analysis
+    if not articles_data:
+        logging.warning("No se pudo extraer contenido de nuevas noticias. Se continuará para actualizar indicadores y análisis.")
+    
+    return articles_data
+
+def research_corpus(memory, reasoning, timings, collect_indicators=collect_economic_data, seen=None):
+    """
+    Pasos 3-8: contexto, noticias e indicadores económicos (a la vez). Es la parte
+    común a todas las ediciones del boletín (news_agent.editions).
+    'seen' activa el modo incremental (ver research_articles).
+    Devuelve el corpus: {"collection", "past_summaries", "articles", "economic_data", "rate_trends"}.
+    """
+    def news_branch():
+        # 3. Retrieve Context
+        with timed(timings, "context"):
+            past_summaries = memory.get_recent_summaries(days=3)
+        return past_summaries, research_articles(memory, reasoning, past_summaries, timings, seen=seen)
+    
+    # Las noticias (3-7) y los indicadores económicos (8) son independientes: se ejecutan a la vez
+    branches = run_concurrently({
+        "news": news_branch,
+        "indicators": collect_indicators,
+    }, timings)
+    past_summaries, articles_data = branches["news"]
+    economic_data = branches["indicators"]
+    return {
+        "collection": memory.collection_name,
+        "past_summaries": past_summaries,
+        "articles": articles_data,
+        "economic_data": economic_data,
+        "rate_trends": record_rates(economic_data),
+    }
+
+def enough_news(articles_data, min_articles, seen=None):
+    """Si no hay 'min_articles' noticias nuevas, quedan pendientes en 'seen' para la próxima ejecución."""
+    if len(articles_data) < min_articles:
+        logging.info(f"Solo {len(articles_data)} noticias nuevas (mínimo {min_articles}): no se genera boletín.")
+        if seen is not None:
+            seen.hold(articles_data)
+        return False
+    return True
+
+def build_newsletter(memory, reasoning, timings, collect_indicators=collect_economic_data, on_html_chunk=None,
+                     seen=None, min_articles=0):
+    """
+    Pasos 3-9: corpus del día (research_corpus) y resumen.
+    Guarda el tiempo de cada etapa en 'timings', incluido el del primer fragmento
+    de HTML ('summary_first_chunk'). Devuelve (summary, topics, articles_data);
+    summary es None si hay menos de 'min_articles' noticias nuevas.
+    """
+    corpus = research_corpus(memory, reasoning, timings, collect_indicators=collect_indicators, seen=seen)
+    if not enough_news(corpus["articles"], min_articles, seen=seen):
+        return None, [], corpus["articles"]
+
+    # 9. Summarize via Reasoning
+    summarize_start = time.monotonic()
+
+    def on_chunk(html):
+        if on_html_chunk:
+            on_html_chunk(html)
+        timings.setdefault("summary_first_chunk", round(time.monotonic() - summarize_start, 3))
+
+    with timed(timings, "summarize"):
+        summary, topics = reasoning.summarize_articles(corpus["articles"], corpus["past_summaries"],
+                                                       economic_data=corpus["economic_data"],
+                                                       rate_trends=corpus["rate_trends"], on_html_chunk=on_chunk)
+    return summary, topics, corpus["articles"]
+
+def build_editions(memory, reasoning, editions, timings, collect_indicators=collect_economic_data,
+                   seen=None, min_articles=0):
+    """
+    Pasos 3-9 para varias ediciones: una sola investigación y un resumen por
+    edición, todos a la vez. Devuelve (results, memories, articles_data), con
+    results = {nombre: (summary, topics)}, o None si hay menos de 'min_articles' noticias nuevas.
+    """
+    corpus = research_corpus(memory, reasoning, timings, collect_indicators=collect_indicators, seen=seen)
+    if not enough_news(corpus["articles"], min_articles, seen=seen):
+        return None, None, corpus["articles"]
+    memories = open_memories(editions, memory)
+    with timed(timings, "summarize"):
+        results = summarize_editions(editions, reasoning, corpus, memories, timings)
+    return results, memories, corpus["articles"]
+
+def deliver_newsletter(memory, summary, topics, articles_data, email, password, bcc_emails=None, outbox=None,
+                       seen=None):
+    """
+    Pasos 10-11: deja el resumen en el outbox, lo envía y, cuando ha llegado a
+    todos los destinatarios, lo guarda en memoria (y marca sus noticias en 'seen',
+    en modo incremental). Si quedan envíos pendientes se
+    pueden reanudar con 'python -m news_agent.delivery --resume'.
+    Devuelve True si no quedó nada pendiente ni fallido.
+    """
+    news_hash = generate_hash(articles_data) # Generate hash before sending email
+    outbox = outbox or open_outbox()
+    metadata = {"topics": topics, "news_hash": news_hash}
+    if seen is not None:
+        # Para que 'delivery --resume' también marque las noticias como vistas
+        metadata["seen_fingerprints"] = fingerprints_of(articles_data)
+    edition_id = outbox.enqueue(email, "Resumen Diario: Cuba", summary, [email] + list(bcc_emails or []),
+                                metadata=metadata)
+    # 11. Save to Memory (una sola vez, al completar la edición)
+    def on_complete(edition):
+        memory.save_summary(topics, summary, news_hash)
+        if seen is not None:
+            seen.add(articles_data)
+
+    try:
+        counts = DeliveryEngine(outbox, email, password).deliver(edition_id, on_complete=on_complete)
+    except SmtpConnectError:
+        # Ya registrado por el motor de envío; todo queda pendiente para --resume
+        return False
+    if counts["pending"]:
+        logging.warning(f"Quedan {counts['pending']} envíos pendientes de la edición {edition_id}.")
+    return not counts["pending"] and not counts["failed"]
+
+def get_credentials(non_interactive):
+    """Cuenta de Gmail del envío (GMAIL_USER, GMAIL_PASSWORD); si falta, se pide en modo interactivo."""
+    email = os.environ.get("GMAIL_USER")
+    password = os.environ.get("GMAIL_PASSWORD")
+    
+    if not email or not password:
+        if non_interactive:
+            logging.error("GMAIL_USER o GMAIL_PASSWORD no configurados en modo no interactivo. Saliendo.")
+            return None, None
+        email = input("Introduce tu correo de Gmail: ")
+        password = getpass.getpass("Introduce tu contraseña de aplicación de Gmail: ")
+    return email, password
+
+def confirm_send(non_interactive, question="¿Deseas enviar este resumen por correo? (s/n): "):
+    return non_interactive or input(question).lower() == 's'
+
+def run_single(memory, reasoning, timings, non_interactive, seen=None, min_articles=0):
+    """Una sola edición: la ejecución de siempre."""
+    # El HTML llega en streaming: con STREAM_SUMMARY se muestra al vuelo
+    stream_summary = os.environ.get("STREAM_SUMMARY", "false").lower() == "true"
+
+    def on_html_chunk(html):
+        if stream_summary:
+            if "summary_first_chunk" not in timings:
+                print("\n--- Resumen Generado (HTML) ---\n")
+            print(html, end="", flush=True)
+
+    summary, topics, articles_data = build_newsletter(memory, reasoning, timings, on_html_chunk=on_html_chunk,
+                                                      seen=seen, min_articles=min_articles)
+    log_timings(timings)
+    if summary is None:
+        print("Sin noticias nuevas suficientes: no se envía boletín.")
+        return
+    # 10. Send Email
+    if not stream_summary or "summary_first_chunk" not in timings:
+        print("\n--- Resumen Generado (HTML) ---\n")
+        print(summary)
+    print(f"\nTemas: {', '.join(topics)}")
+    print("\n------------------------\n")
+    
+    if not confirm_send(non_interactive):
+        print("Operación cancelada por el usuario. No se guardó en memoria.")
+        return
+    email, password = get_credentials(non_interactive)
+    if not email:
+        return
+    
+    bcc_emails_str = os.environ.get("BCC_EMAILS", "")
+    # Use semicolon as delimiter to avoid gcloud issues with commas
+    bcc_emails = [e.strip() for e in bcc_emails_str.split(";")] if bcc_emails_str else None
+    
+    logging.info(f"Sending email to {email} (BCC: {bcc_emails})...")
+    if deliver_newsletter(memory, summary, topics, articles_data, email, password, bcc_emails=bcc_emails, seen=seen):
+        print("¡Correo enviado correctamente!")
+    else:
+        print("Error al enviar el correo.")
+
+def run_editions(memory, reasoning, editions, timings, non_interactive, seen=None, min_articles=0):
+    """Varias ediciones (EDITIONS_FILE) sobre una sola investigación."""
+    results, memories, articles_data = build_editions(memory, reasoning, editions, timings,
+                                                      seen=seen, min_articles=min_articles)
+    log_timings(timings)
+    if results is None:
+        print("Sin noticias nuevas suficientes: no se envía ninguna edición.")
+        return
+    for edition in editions:
+        summary, topics = results[edition.name]
+        print(f"\n--- Edición {edition.name}: {edition.subject} ({len(summary)} caracteres) ---")
+        print(f"Temas: {', '.join(topics)}")
+    print("\n------------------------\n")
+
+    if not confirm_send(non_interactive, f"¿Deseas enviar las {len(editions)} ediciones por correo? (s/n): "):
+        print("Operación cancelada por el usuario. No se guardó en memoria.")
+        return
+    email, password = get_credentials(non_interactive)
+    if not email:
+        return
+    counts = deliver_editions(editions, results, memories, generate_hash(articles_data), email, password,
+                              articles_data=articles_data, seen=seen)
+    for name, edition_counts in counts.items():
+        print(f"Edición {name}: {edition_counts['sent']} enviados, {edition_counts['failed']} fallidos, "
+              f"{edition_counts['pending']} pendientes.")
+
 def main():
     # Load environment variables
     load_dotenv()
@@ -36,113 +355,29 @@ def main():
         logging.error(f"Error al inicializar componentes: {e}")
         return
 
-    # 3. Retrieve Context
-    past_summaries = memory.get_recent_summaries(days=3)
-    
-    # 4. Generate Queries
-    queries = reasoning.generate_search_queries(past_summaries)
-    
-    # 5. Search News
-    logging.info("Buscando noticias...")
-    all_results = reasoning.grounded_search(queries)
-    
-    if not all_results:
-        logging.warning("Grounding no devolvió resultados, intentando búsqueda tradicional...")
-        all_results = []
-        for query in queries:
-            res = search_news(query)
-            all_results.extend(res)
-    
-    if not all_results:
-        logging.warning("No se encontraron noticias.")
-        # Continue to allow economic indicators and analysis
-    
-    # 6. Filter Redundant Articles
-    filtered_results = reasoning.filter_articles(all_results, memory) if all_results else []
-    
-    if not filtered_results and all_results:
-        logging.warning("Todas las noticias encontradas eran redundantes.")
-        # Continue to allow economic indicators and analysis
-    
-    # 7. Scrape Content
-    articles_data = []
-    for res in filtered_results:
-        url = res['url']
-        text = extract_content(url)
-        if text:
-            res['text'] = text
-            articles_data.append(res)
-    
-    if not articles_data:
-        logging.warning("No se pudo extraer contenido de nuevas noticias. Se continuará para actualizar indicadores y análisis.")
-    
-    # 8. Scrape Economic Indicators (Martí Noticias)
-    logging.info("Obteniendo indicadores económicos de Martí Noticias...")
-    marti_text = extract_content("https://www.martinoticias.com/tasa-de-cambio-de-moneda-cuba-hoy")
-    
-    economic_data = marti_text
-    
-    # Fallback to El Toque if Martí fails or doesn't have data
-    if not marti_text or ("USD" not in marti_text and "EUR" not in marti_text):
-        logging.info("Martí Noticias no proporcionó datos claros, intentando con El Toque...")
-        el_toque_text = extract_content("https://eltoque.com/tasas-de-cambio-de-moneda-en-cuba-hoy")
-        economic_data = el_toque_text
-        
-        if not el_toque_text or ("USD" not in el_toque_text and "EUR" not in el_toque_text):
-            logging.info("El Toque tampoco proporcionó datos, intentando con CambioCuba (imagen)...")
-            import requests
-            try:
-                img_response = requests.get("https://wa.cambiocuba.money/trmi.png", timeout=10)
-                if img_response.status_code == 200:
-                    economic_data = img_response.content # Pass bytes
-                    logging.info("Imagen de CambioCuba descargada exitosamente.")
-                else:
-                    logging.warning(f"No se pudo descargar imagen de CambioCuba: {img_response.status_code}")
-            except Exception as e:
-                logging.error(f"Error al descargar imagen de CambioCuba: {e}")
-
-    # 9. Summarize via Reasoning
-    summary, topics = reasoning.summarize_articles(articles_data, past_summaries, economic_data=economic_data)
-    # 10. Send Email
-    print("\n--- Resumen Generado (HTML) ---\n")
-    print(f"Temas: {', '.join(topics)}")
-    print(summary)
-    print("\n------------------------\n")
-    
+    timings = {}
     # Check for non-interactive mode (e.g., Cloud Run)
     non_interactive = os.environ.get("NON_INTERACTIVE", "false").lower() == "true"
-    
-    if non_interactive:
-        send_email_choice = 's'
-    else:
-        send_email_choice = input("¿Deseas enviar este resumen por correo? (s/n): ").lower()
-    
-    if send_email_choice == 's':
-        email = os.environ.get("GMAIL_USER")
-        password = os.environ.get("GMAIL_PASSWORD")
-        
-        if not email or not password:
-            if non_interactive:
-                logging.error("GMAIL_USER o GMAIL_PASSWORD no configurados en modo no interactivo. Saliendo.")
-                return
-            else:
-                email = input("Introduce tu correo de Gmail: ")
-                password = getpass.getpass("Introduce tu contraseña de aplicación de Gmail: ")
-        
-        bcc_emails_str = os.environ.get("BCC_EMAILS", "")
-        # Use semicolon as delimiter to avoid gcloud issues with commas
-        bcc_emails = [e.strip() for e in bcc_emails_str.split(";")] if bcc_emails_str else None
-        
-        logging.info(f"Sending email to {email} (BCC: {bcc_emails})...")
-        news_hash = generate_hash(articles_data) # Generate hash before sending email
-        if send_email(email, password, "Resumen Diario: Cuba", summary, bcc_emails=bcc_emails, is_html=True):
-            print("¡Correo enviado correctamente!")
-            # 11. Save to Memory
-            memory.save_summary(topics, summary, news_hash)
-        else:
-            print("Error al enviar el correo.")
+
+    # Modo incremental (ejecuciones cada hora): solo se procesa lo no visto
+    seen, min_articles = None, 0
+    if os.environ.get("INCREMENTAL", "false").lower() == "true":
+        seen = open_seen_store(db=memory.db)
+        min_articles = int(os.environ.get("INCREMENTAL_MIN_ARTICLES", "3"))
+
+    editions_file = os.environ.get("EDITIONS_FILE")
+    if editions_file:
+        run_editions(memory, reasoning, load_editions(editions_file), timings, non_interactive,
+                     seen=seen, min_articles=min_articles)
     else:
-        print("Operación cancelada por el usuario. No se guardó en memoria.")
+        run_single(memory, reasoning, timings, non_interactive, seen=seen, min_articles=min_articles)
+    
+    if memory.embedding_cache:
+        logging.info(f"Cache de embeddings: {memory.embedding_cache.stats()}")
+    llm_stats = cache_stats(reasoning.client)
+    if llm_stats:
+        logging.info(f"Cache LLM: {llm_stats}")
+    write_report()
 
 if __name__ == "__main__":
     main()
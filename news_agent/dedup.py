@@ -0,0 +1,221 @@
+"""
+Deduplicación local de noticias, antes de las etapas caras (embeddings, LLM, extracción).
+
+- canonical_url(): la misma noticia con parámetros de seguimiento, www., AMP o
+  fragmento distinto tiene la misma URL canónica.
+- MinHash (Jaccard de palabras y pares de palabras) sobre título+snippet, que son
+  textos cortos, y SimHash de 64 bits sobre el texto extraído: las copias sindicadas
+  (EFE, AP...) publicadas en varios medios quedan juntas. Ambos índices usan bandas
+  (LSH), así que los candidatos se encuentran sin comparar todos con todos.
+De cada grupo de duplicados se queda el primero (el mejor posicionado en la búsqueda).
+"""
+import hashlib
+import re
+import threading
+import unicodedata
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import numpy as np
+
+from news_agent.telemetry import count
+
+SIMHASH_BITS = 64
+# Distancia de Hamming máxima para considerar dos textos casi iguales
+MAX_DISTANCE = 3
+# MinHash: 16 bandas de 4 filas agrupan como candidatos los pares con Jaccard desde ~0.5
+# ((1/16) ** (1/4)); se confirman los que superan MIN_JACCARD
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16
+MIN_JACCARD = 0.7
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid", "ref", "ref_src",
+                   "cmpid", "ocid", "smid", "outputtype", "amp", "_ga", "s_cid"}
+TRACKING_PREFIXES = ("utm_", "pk_", "mtm_")
+HOST_PREFIXES = ("www.", "m.", "amp.", "mobile.")
+# Sin texto suficiente las huellas no distinguen noticias distintas
+MIN_FEATURES = 4
+
+_MASK64 = (1 << 64) - 1
+
+_WORD = re.compile(r"\w+")
+
+
+def canonical_url(url):
+    """URL canónica: https, host sin www./m./amp., sin puerto por defecto, fragmento, AMP ni parámetros de seguimiento."""
+    url = (url or "").strip()
+    if url.startswith("www."):
+        url = f"https://{url}"
+    try:
+        parts = urlsplit(url)
+        # Un puerto no numérico solo da error al leerlo
+        port = parts.port
+    except ValueError:
+        return url
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return url
+    host = parts.hostname.lower()
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix) and host.count(".") > 1:
+            host = host[len(prefix):]
+            break
+    if port and port not in (80, 443):
+        host = f"{host}:{port}"
+    path = re.sub(r"/amp/?$|\.amp$", "", parts.path) or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+    return urlunsplit(("https", host, path, urlencode(query), ""))
+
+
+def _features(text, shingle):
+    """Palabras (sin acentos ni mayúsculas) y grupos de 'shingle' palabras consecutivas."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    words = [w for w in _WORD.findall("".join(c for c in text if not unicodedata.combining(c))) if len(w) > 1]
+    features = list(words)
+    features += [" ".join(words[i:i + shingle]) for i in range(len(words) - shingle + 1)] if shingle > 1 else []
+    return features
+
+
+def _digests(features):
+    return b"".join(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest() for feature in features)
+
+
+def simhash(text, shingle=3):
+    """SimHash de 64 bits de 'text', o None si el texto es demasiado corto."""
+    features = _features(text or "", shingle)
+    if len(features) < MIN_FEATURES:
+        return None
+    digests = _digests(features)
+    # Bit i de cada hash en la columna i; el bit de la huella es 1 si la mayoría de hashes lo tiene a 1
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8), bitorder="little").reshape(-1, SIMHASH_BITS)
+    majority = bits.sum(axis=0) * 2 > len(features)
+    return int.from_bytes(np.packbits(majority, bitorder="little").tobytes(), "little")
+
+
+# Familia de hashes multiply-shift: (x XOR semilla) * impar, 64 bits con desbordamiento
+_rng = np.random.default_rng(20250101)
+_SEEDS = _rng.integers(0, _MASK64, size=MINHASH_PERMUTATIONS, dtype=np.uint64, endpoint=True)
+_MULTIPLIERS = _rng.integers(0, _MASK64, size=MINHASH_PERMUTATIONS, dtype=np.uint64, endpoint=True) | np.uint64(1)
+
+
+def minhash(text, shingle=2):
+    """Firma MinHash (MINHASH_PERMUTATIONS valores) de 'text', o None si es demasiado corto."""
+    features = set(_features(text or "", shingle))
+    if len(features) < MIN_FEATURES:
+        return None
+    hashes = np.frombuffer(_digests(sorted(features)), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        permuted = (hashes[:, None] ^ _SEEDS) * _MULTIPLIERS
+    return permuted.min(axis=0)
+
+
+class MinHashIndex:
+    """Índice LSH de firmas MinHash: candidatos por bandas, confirmados por Jaccard estimado."""
+
+    def __init__(self, min_jaccard=MIN_JACCARD, bands=MINHASH_BANDS):
+        self.min_jaccard = min_jaccard
+        self.bands = bands
+        self.rows = MINHASH_PERMUTATIONS // bands
+        self._buckets = {}
+
+    def _keys(self, signature):
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def find(self, signature):
+        """Valor asociado a una firma con Jaccard estimado >= min_jaccard, o None."""
+        for key in self._keys(signature):
+            for other, value in self._buckets.get(key, ()):
+                if np.mean(signature == other) >= self.min_jaccard:
+                    return value
+        return None
+
+    def add(self, signature, value):
+        for key in self._keys(signature):
+            self._buckets.setdefault(key, []).append((signature, value))
+
+
+class SimHashIndex:
+    """
+    Índice de SimHash por bandas: con MAX_DISTANCE + 1 bandas, dos huellas a
+    distancia <= MAX_DISTANCE coinciden al menos en una banda (principio del palomar).
+    """
+
+    def __init__(self, max_distance=MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = SIMHASH_BITS // self.bands
+        self._buckets = {}
+
+    def _keys(self, h):
+        mask = (1 << self.band_bits) - 1
+        return [(band, h >> (band * self.band_bits) & mask) for band in range(self.bands)]
+
+    def find(self, h):
+        """Valor asociado a una huella a distancia <= max_distance de 'h', o None."""
+        for key in self._keys(h):
+            for other, value in self._buckets.get(key, ()):
+                if (h ^ other).bit_count() <= self.max_distance:
+                    return value
+        return None
+
+    def add(self, h, value):
+        for key in self._keys(h):
+            self._buckets.setdefault(key, []).append((h, value))
+
+
+class Deduplicator:
+    """
+    Deduplicación de los resultados de una ejecución (segura entre hilos).
+    add_result() se aplica a los resultados de búsqueda y add_text() a los artículos
+    ya extraídos; los duplicados se anotan en 'duplicates' del representante.
+    """
+
+    def __init__(self, max_distance=MAX_DISTANCE):
+        self._lock = threading.Lock()
+        self._urls = {}
+        self._snippets = MinHashIndex()
+        self._texts = SimHashIndex(max_distance)
+        self.dropped = {"url": 0, "snippet": 0, "text": 0}
+
+    def _drop(self, kind, representative, article):
+        self.dropped[kind] += 1
+        count("dedup_dropped", kind=kind)
+        if representative is not article:
+            representative.setdefault("duplicates", []).append(article.get("url"))
+
+    def add_result(self, article):
+        """True si el resultado es nuevo; False si repite la URL o el título+snippet de otro."""
+        url = canonical_url(article.get("url"))
+        signature = minhash(f"{article.get('title') or ''} {article.get('snippet') or ''}")
+        with self._lock:
+            if url and url in self._urls:
+                self._drop("url", self._urls[url], article)
+                return False
+            representative = self._snippets.find(signature) if signature is not None else None
+            if representative is not None:
+                self._drop("snippet", representative, article)
+                return False
+            if url:
+                self._urls[url] = article
+            if signature is not None:
+                self._snippets.add(signature, article)
+            return True
+
+    def add_text(self, article):
+        """True si el texto extraído no es casi igual al de otro artículo ya aceptado."""
+        h = simhash(article.get("text") or "")
+        if h is None:
+            return True
+        with self._lock:
+            representative = self._texts.find(h)
+            if representative is not None:
+                self._drop("text", representative, article)
+                return False
+            self._texts.add(h, article)
+            return True
+
+    def dedupe(self, articles):
+        """Los artículos de 'articles' que add_result() acepta, en orden."""
+        return [article for article in articles if self.add_result(article)]
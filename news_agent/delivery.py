@@ -0,0 +1,448 @@
+"""
+Newsletter delivery: a persistent outbox drained over one kept-alive SMTP session.
+
+Every recipient of an edition is a row in the outbox (SQLite under
+NEWS_AGENT_DATA_DIR), so a run that fails halfway can be resumed later without
+regenerating the summary:
+
+    python -m news_agent.delivery --status
+    python -m news_agent.delivery --resume
+
+Messages go out one per recipient (To: the recipient) or, with
+MAIL_DELIVERY_MODE=segment, one per segment with the members on BCC. Sends are
+spaced to MAIL_RATE_PER_MINUTE recipients per minute, stop at MAIL_DAILY_QUOTA
+recipients per 24h, and temporary (4xx) errors are retried with exponential backoff.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import smtplib
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from news_agent.mailer import build_message, smtp_settings
+from news_agent.rates_store import DEFAULT_DATA_DIR
+from news_agent.telemetry import count, span
+
+MODES = ("recipient", "segment")
+DEFAULT_SEGMENT = "default"
+DEFAULT_RATE_PER_MINUTE = 60
+# Recipients per message in segment mode (Gmail accepts up to 100)
+SEGMENT_SIZE = 50
+
+PENDING, SENT, FAILED = "pending", "sent", "failed"
+
+
+def is_transient(error):
+    """True for errors worth retrying: 4xx replies and dropped connections."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError))
+
+
+class SmtpConnectError(Exception):
+    """The SMTP server could not be reached or refused the login: fatal for the whole run."""
+
+
+class SmtpSession:
+    """
+    One authenticated SMTP connection reused for a batch of messages.
+    It is opened on the first send and reopened on the next one if the server drops it.
+    """
+
+    def __init__(self, user, password, host=None, port=None, starttls=None, timeout=30):
+        self.user = user
+        self.password = password
+        self.host, self.port, self.starttls = smtp_settings(host, port, starttls)
+        self.timeout = timeout
+        self.connections = 0
+        self._server = None
+
+    def _connect(self):
+        server = None
+        try:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                server.starttls()
+            if self.password:
+                server.login(self.user, self.password)
+        except (smtplib.SMTPException, OSError) as e:
+            if server is not None:
+                server.close()
+            raise SmtpConnectError(f"Could not connect to {self.host}:{self.port}: {e}") from e
+        self._server = server
+        self.connections += 1
+
+    def send(self, msg, recipients):
+        """Sends 'msg' to 'recipients'. Returns {recipient: (code, message)} for the refused ones."""
+        if self._server is None:
+            self._connect()
+        try:
+            return self._server.sendmail(self.user, recipients, msg.as_string())
+        except smtplib.SMTPServerDisconnected:
+            self._server = None
+            raise
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except smtplib.SMTPException:
+                pass
+            self._server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class RateLimiter:
+    """Spaces sends so that no more than 'per_minute' recipients are reached per minute."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next = 0.0
+
+    def wait(self, recipients=1):
+        now = time.monotonic()
+        if now < self._next:
+            time.sleep(self._next - now)
+            now = self._next
+        self._next = now + self.interval * recipients
+
+
+class Outbox:
+    """Editions and their per-recipient delivery state, persisted in SQLite."""
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(os.environ.get("NEWS_AGENT_DATA_DIR", DEFAULT_DATA_DIR), "outbox.sqlite3")
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS editions ("
+            " id TEXT PRIMARY KEY, sender TEXT NOT NULL, subject TEXT NOT NULL, body TEXT NOT NULL,"
+            " is_html INTEGER NOT NULL, metadata TEXT, created REAL NOT NULL, completed REAL);"
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " edition_id TEXT NOT NULL, recipient TEXT NOT NULL, segment TEXT NOT NULL, status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT, updated REAL NOT NULL,"
+            " PRIMARY KEY (edition_id, recipient));"
+            "CREATE INDEX IF NOT EXISTS messages_status ON messages (status, updated);"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def make_id(sender, subject, body):
+        return hashlib.sha256(f"{sender}\0{subject}\0{body}".encode("utf-8")).hexdigest()[:16]
+
+    def enqueue(self, sender, subject, body, recipients, is_html=True, metadata=None):
+        """
+        Stores an edition and one pending row per recipient ('address' or (address, segment)).
+        Enqueuing the same edition again only adds new recipients. Returns the edition id.
+        """
+        edition_id = self.make_id(sender, subject, body)
+        now = time.time()
+        rows = []
+        for recipient in recipients:
+            address, segment = recipient if isinstance(recipient, (tuple, list)) else (recipient, DEFAULT_SEGMENT)
+            if address:
+                rows.append((edition_id, address.strip(), segment, PENDING, now))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO editions (id, sender, subject, body, is_html, metadata, created)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (edition_id, sender, subject, body, int(is_html), json.dumps(metadata or {}, ensure_ascii=False), now)
+            )
+            self._db.executemany(
+                "INSERT OR IGNORE INTO messages (edition_id, recipient, segment, status, updated) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._db.commit()
+        return edition_id
+
+    def edition(self, edition_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, sender, subject, body, is_html, metadata, created, completed FROM editions WHERE id = ?",
+                (edition_id,)
+            ).fetchone()
+        if not row:
+            return None
+        keys = ("id", "sender", "subject", "body", "is_html", "metadata", "created", "completed")
+        edition = dict(zip(keys, row))
+        edition["is_html"] = bool(edition["is_html"])
+        edition["metadata"] = json.loads(edition["metadata"] or "{}")
+        return edition
+
+    def pending(self, edition_id):
+        """[(recipient, segment)] still to be sent, in the order they were enqueued."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT recipient, segment FROM messages WHERE edition_id = ? AND status = ? ORDER BY rowid",
+                (edition_id, PENDING)
+            ).fetchall()
+
+    def mark(self, edition_id, recipients, status, error=None):
+        with self._lock:
+            self._db.executemany(
+                "UPDATE messages SET status = ?, attempts = attempts + 1, last_error = ?, updated = ?"
+                " WHERE edition_id = ? AND recipient = ?",
+                [(status, error, time.time(), edition_id, recipient) for recipient in recipients]
+            )
+            self._db.commit()
+
+    def counts(self, edition_id):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT status, COUNT(*) FROM messages WHERE edition_id = ? GROUP BY status", (edition_id,)
+            ).fetchall()
+        return {PENDING: 0, SENT: 0, FAILED: 0, **dict(rows)}
+
+    def sent_since(self, timestamp):
+        """Recipients reached since 'timestamp' (for the daily quota)."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM messages WHERE status = ? AND updated >= ?", (SENT, timestamp)
+            ).fetchone()[0]
+
+    def mark_completed(self, edition_id):
+        with self._lock:
+            self._db.execute("UPDATE editions SET completed = ? WHERE id = ?", (time.time(), edition_id))
+            self._db.commit()
+
+    def open_editions(self):
+        """Ids of the editions with pending recipients, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT DISTINCT e.id FROM editions e JOIN messages m ON m.edition_id = e.id"
+                " WHERE m.status = ? ORDER BY e.created", (PENDING,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def recent(self, limit=10):
+        with self._lock:
+            ids = [row[0] for row in self._db.execute(
+                "SELECT id FROM editions ORDER BY created DESC LIMIT ?", (limit,)
+            )]
+        return [(self.edition(edition_id), self.counts(edition_id)) for edition_id in ids]
+
+    def close(self):
+        self._db.close()
+
+
+def open_outbox(path=None):
+    """
+    The persistent outbox or, if its file cannot be opened, an in-memory one:
+    the newsletter is still sent, but an interrupted delivery cannot be resumed.
+    """
+    try:
+        return Outbox(path)
+    except (OSError, sqlite3.Error) as e:
+        logging.warning(f"Outbox unavailable ({e}); delivering without persistence, --resume will not see this run.")
+        count("outbox_fallbacks")
+        return Outbox(":memory:")
+
+
+class DeliveryEngine:
+    """
+    Sends the pending recipients of an outbox edition over a single SMTP session.
+    'personalize(body, recipient)' can adapt the body of each per-recipient message.
+    """
+
+    def __init__(self, outbox, user, password, mode=None, per_minute=None, daily_quota=None,
+                 max_attempts=4, backoff=2.0, segment_size=SEGMENT_SIZE, personalize=None,
+                 host=None, port=None, starttls=None):
+        self.outbox = outbox
+        self.user = user
+        self.password = password
+        self.mode = (mode or os.environ.get("MAIL_DELIVERY_MODE", "recipient")).lower()
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown delivery mode '{self.mode}', expected one of {MODES}")
+        if per_minute is None:
+            per_minute = float(os.environ.get("MAIL_RATE_PER_MINUTE", DEFAULT_RATE_PER_MINUTE))
+        self.limiter = RateLimiter(per_minute)
+        self.daily_quota = int(os.environ.get("MAIL_DAILY_QUOTA", 0)) if daily_quota is None else daily_quota
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.segment_size = segment_size
+        self.personalize = personalize
+        self.smtp = (host, port, starttls)
+
+    def _batches(self, pending):
+        if self.mode == "recipient":
+            return [[recipient] for recipient, _ in pending]
+        segments = {}
+        for recipient, segment in pending:
+            segments.setdefault(segment, []).append(recipient)
+        return [members[i:i + self.segment_size]
+                for members in segments.values() for i in range(0, len(members), self.segment_size)]
+
+    def _message(self, edition, recipients):
+        body = edition["body"]
+        if self.mode == "recipient":
+            if self.personalize:
+                body = self.personalize(body, recipients[0])
+            return build_message(edition["sender"], recipients[0], edition["subject"], body, is_html=edition["is_html"])
+        # Segment messages are addressed to the sender; the members only appear in the envelope (BCC)
+        return build_message(edition["sender"], edition["sender"], edition["subject"], body, is_html=edition["is_html"])
+
+    def _quota_left(self):
+        if not self.daily_quota:
+            return None
+        return self.daily_quota - self.outbox.sent_since(time.time() - 24 * 3600)
+
+    def _send(self, session, edition, recipients):
+        edition_id = edition["id"]
+        msg = self._message(edition, recipients)
+        for attempt in range(1, self.max_attempts + 1):
+            self.limiter.wait(len(recipients))
+            try:
+                with span("smtp.send"):
+                    refused = session.send(msg, recipients)
+            except SmtpConnectError:
+                # Not a problem of these recipients: they stay pending
+                raise
+            except Exception as e:
+                if isinstance(e, smtplib.SMTPRecipientsRefused) and not is_transient(e):
+                    refused = e.recipients
+                elif is_transient(e) and attempt < self.max_attempts:
+                    delay = self.backoff * 2 ** (attempt - 1) * random.uniform(1.0, 1.25)
+                    logging.warning(f"Temporary SMTP error sending to {len(recipients)} recipient(s), "
+                                    f"retrying in {delay:.1f}s: {e}")
+                    count("mail_retries")
+                    time.sleep(delay)
+                    continue
+                else:
+                    # Temporary errors stay pending for a later --resume
+                    status = PENDING if is_transient(e) else FAILED
+                    logging.error(f"Could not send to {', '.join(recipients)} ({status}): {e}")
+                    self.outbox.mark(edition_id, recipients, status, error=str(e))
+                    count("mail_recipients", len(recipients), status=status)
+                    return
+
+            delivered = [r for r in recipients if r not in refused]
+            if delivered:
+                self.outbox.mark(edition_id, delivered, SENT)
+                count("mail_recipients", len(delivered), status=SENT)
+            for recipient, (code, message) in refused.items():
+                status = PENDING if 400 <= code < 500 else FAILED
+                self.outbox.mark(edition_id, [recipient], status, error=f"{code} {message!r}")
+                count("mail_recipients", status=status)
+            return
+
+    def session(self):
+        """A new SmtpSession with this engine's server settings, to share across deliver() calls."""
+        return SmtpSession(self.user, self.password, *self.smtp)
+
+    def deliver(self, edition_id, on_complete=None, session=None):
+        """
+        Sends the pending recipients of an edition. When none is left pending and at
+        least one was reached, calls 'on_complete(edition)' once (e.g. to save the
+        summary to memory). Returns the counts per status.
+        'session' reuses an open SmtpSession (e.g. for several editions) and is
+        left open; otherwise one is opened and closed for this edition.
+        Raises SmtpConnectError if the server cannot be reached or the login fails;
+        the recipients not reached yet stay pending.
+        """
+        edition = self.outbox.edition(edition_id)
+        if edition is None:
+            raise KeyError(f"Unknown edition {edition_id}")
+        pending = self.outbox.pending(edition_id)
+        batches = self._batches(pending)
+        start = time.monotonic()
+
+        own_session = session is None
+        session = session or self.session()
+        connections_before = session.connections
+        try:
+            for batch in batches:
+                quota_left = self._quota_left()
+                if quota_left is not None and quota_left < len(batch):
+                    logging.warning(f"Daily quota of {self.daily_quota} recipients reached; "
+                                    f"the rest of edition {edition_id} stays in the outbox.")
+                    break
+                self._send(session, edition, batch)
+        except SmtpConnectError as e:
+            logging.error(f"{e}; {self.outbox.counts(edition_id)[PENDING]} recipient(s) of edition "
+                          f"{edition_id} stay pending.")
+            count("mail_connect_errors")
+            raise
+        finally:
+            if own_session:
+                session.close()
+        connections = session.connections - connections_before
+
+        counts = self.outbox.counts(edition_id)
+        logging.info(f"Edition {edition_id}: {counts[SENT]} sent, {counts[FAILED]} failed, {counts[PENDING]} pending "
+                     f"({len(batches)} messages, {connections} new SMTP connection(s), {time.monotonic() - start:.1f}s).")
+        if not counts[PENDING] and counts[SENT] and not edition["completed"]:
+            if on_complete:
+                on_complete(edition)
+            self.outbox.mark_completed(edition_id)
+        return counts
+
+
+def _save_to_memory(edition):
+    from news_agent.providers import get_memory
+
+    metadata = edition["metadata"]
+    memory = get_memory(api_key=os.environ.get("GOOGLE_API_KEY"))
+    collection = metadata.get("collection")
+    if collection and collection != memory.collection_name:
+        # Edition with its own memory namespace (news_agent.editions)
+        from news_agent.memory import NewsMemory
+        memory = NewsMemory(collection_name=collection, db=memory.db, genai_client=memory.genai_client)
+    memory.save_summary(metadata.get("topics", []), edition["body"], metadata.get("news_hash"))
+    if metadata.get("seen_fingerprints"):
+        # Modo incremental: sus noticias quedan vistas, como al enviarlo desde main.py
+        from news_agent.seen_store import open_seen_store
+        open_seen_store(db=memory.db).add_fingerprints(metadata["seen_fingerprints"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Newsletter outbox: show its state or resume pending deliveries.")
+    parser.add_argument("--status", action="store_true", help="List the latest editions and their delivery counts.")
+    parser.add_argument("--resume", action="store_true", help="Send the pending recipients of every open edition.")
+    parser.add_argument("--edition", help="Only resume this edition id.")
+    parser.add_argument("--no-memory", action="store_true", help="Do not save completed editions to memory.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    outbox = Outbox()
+
+    if args.resume:
+        user, password = os.environ.get("GMAIL_USER"), os.environ.get("GMAIL_PASSWORD")
+        if not user or not password:
+            logging.error("GMAIL_USER and GMAIL_PASSWORD must be set to resume deliveries.")
+            return 1
+        engine = DeliveryEngine(outbox, user, password)
+        try:
+            with engine.session() as session:
+                for edition_id in ([args.edition] if args.edition else outbox.open_editions()):
+                    engine.deliver(edition_id, on_complete=None if args.no_memory else _save_to_memory,
+                                   session=session)
+        except SmtpConnectError:
+            return 1
+
+    for edition, counts in outbox.recent():
+        created = datetime.fromtimestamp(edition["created"], tz=timezone.utc).strftime("%Y-%m-%d %H:%M")
+        state = "complete" if edition["completed"] else "open"
+        print(f"{edition['id']}  {created}  {state:<8}  sent={counts[SENT]} failed={counts[FAILED]} "
+              f"pending={counts[PENDING]}  {edition['subject']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+"""Resumen compacto de los temas ya cubiertos, para el contexto de los prompts."""
+
+
+def format_topic_digest(summaries, max_topics=30):
+    """
+    Convierte los resúmenes en una línea por día con sus temas, sin repetir
+    un tema ya listado en un día más reciente. Los resúmenes deben venir del
+    más reciente al más antiguo.
+    """
+    seen = set()
+    lines = []
+    total = 0
+    for summary in summaries:
+        timestamp = summary.get("timestamp")
+        day = timestamp.strftime("%Y-%m-%d") if hasattr(timestamp, "strftime") else str(timestamp)
+        new_topics = []
+        for topic in summary.get("topics_covered") or []:
+            key = " ".join(topic.casefold().split())
+            if key and key not in seen and total < max_topics:
+                seen.add(key)
+                new_topics.append(topic)
+                total += 1
+        if new_topics:
+            lines.append(f"- {day}: {', '.join(new_topics)}")
+    return "\n".join(lines)
@@ -0,0 +1,174 @@
+"""
+Ediciones del boletín: varias audiencias a partir de una sola investigación.
+
+EDITIONS_FILE apunta a un YAML con la lista de ediciones, por ejemplo:
+
+    editions:
+      - name: general
+        subject: "Resumen Diario: Cuba"
+        recipients_env: BCC_EMAILS
+      - name: economia
+        subject: "Economía de Cuba"
+        collection: news_agent_memory_economia
+        instructions: |
+          Céntrate solo en economía: tasas de cambio, inversión y comercio exterior.
+        recipients: [economia@example.com]
+
+La búsqueda, la extracción y los indicadores se hacen una vez (main.research_corpus)
+y cada edición solo añade una llamada de resumen, con sus instrucciones y su propia
+memoria (NewsMemory(collection_name=...)) para el contexto y el guardado.
+"""
+import logging
+import os
+
+import yaml
+
+from news_agent.delivery import DeliveryEngine, SmtpConnectError, open_outbox
+from news_agent.memory import NewsMemory
+from news_agent.pipeline import run_concurrently
+from news_agent.seen_store import fingerprints_of
+
+DEFAULT_COLLECTION = "news_agent_memory"
+DEFAULT_SUBJECT = "Resumen Diario: Cuba"
+
+
+class Edition:
+    """
+    Una edición del boletín. 'instructions' se añade al prompt de resumen;
+    'collection' es el espacio de memoria de la edición.
+    """
+
+    def __init__(self, name, subject=DEFAULT_SUBJECT, collection=DEFAULT_COLLECTION, instructions=None,
+                 recipients=None, include_sender=True):
+        self.name = name
+        self.subject = subject
+        self.collection = collection
+        self.instructions = instructions
+        self.recipients = list(recipients or [])
+        # Como en la edición única, el remitente recibe también el boletín
+        self.include_sender = include_sender
+
+    def __repr__(self):
+        return f"Edition({self.name!r}, collection={self.collection!r}, recipients={len(self.recipients)})"
+
+
+def _recipients(config):
+    recipients = config.get("recipients") or []
+    if isinstance(recipients, str):
+        recipients = recipients.split(";")
+    env_name = config.get("recipients_env")
+    if env_name and os.environ.get(env_name):
+        recipients = list(recipients) + os.environ[env_name].split(";")
+    return [r.strip() for r in recipients if r and r.strip()]
+
+
+def load_editions(path):
+    """Lee las ediciones de un YAML ('editions: [...]' o directamente la lista)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = yaml.safe_load(f) or []
+    items = data.get("editions", []) if isinstance(data, dict) else data
+
+    editions = []
+    for config in items:
+        if not config.get("name"):
+            raise ValueError(f"Edición sin 'name' en {path}: {config}")
+        if any(edition.name == config["name"] for edition in editions):
+            raise ValueError(f"Edición repetida en {path}: {config['name']}")
+        editions.append(Edition(
+            config["name"],
+            subject=config.get("subject", DEFAULT_SUBJECT),
+            collection=config.get("collection", DEFAULT_COLLECTION),
+            instructions=config.get("instructions"),
+            recipients=_recipients(config),
+            include_sender=config.get("include_sender", True),
+        ))
+    if not editions:
+        raise ValueError(f"No hay ediciones en {path}")
+    logging.info(f"Ediciones cargadas de {path}: {', '.join(edition.name for edition in editions)}")
+    return editions
+
+
+def open_memories(editions, memory):
+    """
+    NewsMemory de cada colección usada por las ediciones. 'memory' se reutiliza para
+    su propia colección y las demás comparten sus clientes y su cache de embeddings.
+    """
+    memories = {memory.collection_name: memory}
+    for edition in editions:
+        if edition.collection not in memories:
+            memories[edition.collection] = NewsMemory(collection_name=edition.collection, db=memory.db,
+                                                      genai_client=memory.genai_client,
+                                                      embedding_cache=memory.embedding_cache,
+                                                      use_local_index=memory.use_local_index)
+    return memories
+
+
+def summarize_editions(editions, reasoning, corpus, memories, timings=None):
+    """
+    Resume el corpus compartido para todas las ediciones a la vez.
+    Devuelve {nombre: (summary, topics)} en el orden de 'editions'.
+    """
+    def summarize(edition):
+        def run():
+            memory = memories[edition.collection]
+            past_summaries = corpus["past_summaries"]
+            if memory.collection_name != corpus.get("collection"):
+                past_summaries = memory.get_recent_summaries(days=3)
+            return reasoning.summarize_articles(corpus["articles"], past_summaries,
+                                                economic_data=corpus["economic_data"],
+                                                rate_trends=corpus["rate_trends"],
+                                                instructions=edition.instructions)
+        return run
+
+    results = run_concurrently({f"summarize[{edition.name}]": summarize(edition) for edition in editions}, timings)
+    return {edition.name: results[f"summarize[{edition.name}]"] for edition in editions}
+
+
+def deliver_editions(editions, results, memories, news_hash, email, password, outbox=None,
+                     articles_data=None, seen=None):
+    """
+    Deja todas las ediciones en el outbox y las envía; cada una se guarda en su
+    memoria al completarse y sus noticias ('articles_data') se marcan en 'seen'
+    (modo incremental). Devuelve {nombre: contadores de envío}.
+    Si no se puede conectar con el servidor SMTP no se intenta el resto: las
+    ediciones quedan pendientes en el outbox.
+    """
+    outbox = outbox or open_outbox()
+    # Para que 'delivery --resume' también marque las noticias como vistas
+    fingerprints = fingerprints_of(articles_data) if seen is not None and articles_data else None
+    edition_ids = {}
+    for edition in editions:
+        summary, topics = results[edition.name]
+        recipients = ([email] if edition.include_sender else []) + edition.recipients
+        if not recipients:
+            logging.warning(f"La edición {edition.name} no tiene destinatarios.")
+            continue
+        # Todo queda en el outbox antes del primer envío: un fallo se puede reanudar
+        edition_ids[edition.name] = outbox.enqueue(
+            email, edition.subject, summary, [(recipient, edition.name) for recipient in recipients],
+            metadata={"edition": edition.name, "collection": edition.collection,
+                      "topics": topics, "news_hash": news_hash, "seen_fingerprints": fingerprints})
+
+    engine = DeliveryEngine(outbox, email, password)
+    counts = {}
+    # Una sola conexión SMTP para todas las ediciones
+    with engine.session() as session:
+        for edition in editions:
+            if edition.name not in edition_ids:
+                continue
+            summary, topics = results[edition.name]
+            memory = memories[edition.collection]
+
+            def on_complete(_, memory=memory, summary=summary, topics=topics):
+                memory.save_summary(topics, summary, news_hash)
+                if seen is not None and articles_data:
+                    seen.add(articles_data)
+
+            try:
+                counts[edition.name] = engine.deliver(edition_ids[edition.name], on_complete=on_complete,
+                                                      session=session)
+            except SmtpConnectError:
+                break
+    for name, edition_id in edition_ids.items():
+        counts.setdefault(name, outbox.counts(edition_id))
+    return counts
@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "news_agent")
+
+
+def normalize_text(text):
+    """Normaliza un texto para que variantes triviales (espacios, Unicode) compartan entrada."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCache:
+    """
+    Cache de embeddings direccionada por contenido, con clave (modelo, texto normalizado).
+
+    Tiene dos niveles: un LRU en memoria y un fichero SQLite en disco que
+    persiste entre ejecuciones. El nivel en disco expulsa las entradas menos
+    usadas cuando supera 'max_disk_bytes'.
+    """
+
+    def __init__(self, path=None, max_memory_entries=2048, max_disk_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings ("
+                    "key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+                )
+                self._db.commit()
+            except (OSError, sqlite3.Error) as e:
+                logging.warning(f"Cache de embeddings en disco no disponible ({path}), solo en memoria: {e}")
+                self._db = None
+
+    @classmethod
+    def from_env(cls):
+        """Crea la cache según NEWS_AGENT_EMBEDDING_CACHE y NEWS_AGENT_CACHE_DIR."""
+        if os.environ.get("NEWS_AGENT_EMBEDDING_CACHE", "true").lower() != "true":
+            return None
+        cache_dir = os.environ.get("NEWS_AGENT_CACHE_DIR", DEFAULT_CACHE_DIR)
+        return cls(path=os.path.join(cache_dir, "embeddings.sqlite3"))
+
+    @staticmethod
+    def make_key(model, text):
+        return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model, texts):
+        """Devuelve una lista con el embedding de cada texto, o None si no está en cache."""
+        keys = [self.make_key(model, text) for text in texts]
+        results = [None] * len(texts)
+        with self._lock:
+            missing = []
+            for i, key in enumerate(keys):
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    results[i] = self._memory[key]
+                    self.memory_hits += 1
+                else:
+                    missing.append(i)
+
+            if missing and self._db is not None:
+                now = time.time()
+                for i in missing:
+                    row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (keys[i],)).fetchone()
+                    if row:
+                        results[i] = array("f", row[0]).tolist()
+                        self._remember(keys[i], results[i])
+                        self._db.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (now, keys[i]))
+                        self.disk_hits += 1
+                self._db.commit()
+
+            self.misses += sum(1 for result in results if result is None)
+        return results
+
+    def put_many(self, model, texts, embeddings):
+        """Guarda los embeddings de los textos en ambos niveles."""
+        with self._lock:
+            now = time.time()
+            for text, embedding in zip(texts, embeddings):
+                key = self.make_key(model, text)
+                self._remember(key, list(embedding))
+                if self._db is not None:
+                    blob = array("f", embedding).tobytes()
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO embeddings (key, vector, size, last_used) VALUES (?, ?, ?, ?)",
+                        (key, blob, len(blob), now)
+                    )
+            if self._db is not None:
+                self._evict()
+                self._db.commit()
+
+    def stats(self):
+        """Contadores de aciertos y fallos de la cache."""
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _remember(self, key, embedding):
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        # Expulsa las entradas menos usadas hasta quedar en el 90% del límite
+        excess = total - int(self.max_disk_bytes * 0.9)
+        freed = 0
+        stale = []
+        for key, size in self._db.execute("SELECT key, size FROM embeddings ORDER BY last_used ASC"):
+            if freed >= excess:
+                break
+            stale.append((key,))
+            freed += size
+        self._db.executemany("DELETE FROM embeddings WHERE key = ?", stale)
+        logging.info(f"Cache de embeddings: expulsadas {len(stale)} entradas ({freed} bytes).")
@@ -0,0 +1,204 @@
+"""
+HTML-to-text extraction backends used by news_agent.scraper.
+
+All backends drop the same boilerplate tags and apply the same line cleanup,
+so for the same page they produce the same text, malformed markup included
+(stray end tags, unclosed blocks, markup inside <textarea>). The one known
+difference: BeautifulSoup drops the ';' of unknown entity references such as "&foo;".
+
+Backends:
+- "bs4": BeautifulSoup with html.parser (original implementation).
+- "lxml": libxml2 parser, several times faster on large pages.
+- "stream": incremental tokenizer from the standard library that discards
+  boilerplate while parsing, without building a DOM. It can be fed chunk by chunk.
+"""
+import logging
+import os
+import re
+from html.parser import HTMLParser
+
+# Tags removed together with their content
+BOILERPLATE_TAGS = {"script", "style", "nav", "footer", "header"}
+# Tags whose strings BeautifulSoup does not report as text
+NON_TEXT_TAGS = {"template", "rt", "rp"}
+# Elements whose content libxml2 keeps as raw text but html.parser parses as markup
+RAW_TEXT_TAGS = ("textarea", "title", "xmp", "iframe", "noembed", "noframes", "plaintext")
+# Elements without end tag (never pushed on the open-tag stack)
+VOID_TAGS = {
+    "area", "base", "basefont", "bgsound", "br", "col", "command", "embed", "frame", "hr",
+    "image", "img", "input", "isindex", "keygen", "link", "menuitem", "meta", "nextid",
+    "param", "source", "spacer", "track", "wbr",
+}
+
+BACKENDS = ("bs4", "lxml", "stream")
+
+def default_backend():
+    return os.environ.get("SCRAPER_BACKEND", "bs4").lower()
+
+def clean_text(text):
+    """Strips each line, breaks multi-headlines into a line each and drops blank lines."""
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return '\n'.join(chunk for chunk in chunks if chunk)
+
+def extract_text(html, backend=None, main_content=False):
+    """
+    Extracts the visible text of an HTML document with the selected backend.
+    With main_content=True only the densest article-like block is kept (uses lxml).
+    """
+    backend = backend or default_backend()
+    if main_content or backend == "lxml":
+        try:
+            import lxml.html  # noqa: F401
+        except ImportError:
+            logging.warning("lxml not installed, using bs4 extraction.")
+            return bs4_text(html)
+        return lxml_main_content(html) if main_content else lxml_text(html)
+    if backend == "stream":
+        extractor = StreamingTextExtractor()
+        extractor.feed(html)
+        return extractor.finish()
+    if backend != "bs4":
+        logging.warning(f"Unknown scraper backend '{backend}', using bs4.")
+    return bs4_text(html)
+
+# --- BeautifulSoup ---
+
+def bs4_text(html):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Remove script and style elements
+    for script in soup(list(BOILERPLATE_TAGS)):
+        script.decompose()
+
+    return clean_text(soup.get_text(separator='\n'))
+
+# --- lxml ---
+
+# Private-use character marking where an end tag was. libxml2 drops stray end
+# tags and merges the text around them, while html.parser starts a new string there.
+_BOUNDARY = "\ue000"
+_END_TAG = re.compile(r"</(?=[A-Za-z])")
+_RAW_TEXT_TAG = re.compile(rf"<(/?)({'|'.join(RAW_TEXT_TAGS)})\b", re.I)
+
+def _prepare(html):
+    """Makes libxml2 split and parse text the way html.parser does (see _BOUNDARY and RAW_TEXT_TAGS)."""
+    html = _RAW_TEXT_TAG.sub(r"<\1x-\2", html)
+    return _END_TAG.sub(_BOUNDARY + "</", html)
+
+def _lxml_root(html):
+    import lxml.html
+
+    html = _prepare(html)
+    try:
+        return lxml.html.document_fromstring(html)
+    except ValueError:
+        # Unicode strings with an XML encoding declaration must be parsed as bytes
+        return lxml.html.document_fromstring(html.encode("utf-8"))
+
+def _iter_strings(element):
+    tag = element.tag
+    # Comments and processing instructions have a non-string tag; only their tail is text
+    if not isinstance(tag, str) or tag in BOILERPLATE_TAGS or tag in NON_TEXT_TAGS:
+        return
+    if element.text:
+        yield from element.text.split(_BOUNDARY)
+    for child in element:
+        yield from _iter_strings(child)
+        if child.tail:
+            yield from child.tail.split(_BOUNDARY)
+
+def lxml_text(html):
+    return clean_text('\n'.join(_iter_strings(_lxml_root(html))))
+
+# Class/id hints for blocks that are not the article body
+_NEGATIVE_HINTS = re.compile(r"comment|sidebar|menu|footer|share|social|related|promo|banner|widget|newsletter|cookie", re.I)
+_BLOCK_TAGS = ("article", "main", "section", "div", "td")
+
+def _text_length(element):
+    return sum(len(s.strip()) for s in _iter_strings(element))
+
+def _link_text_length(element):
+    return sum(_text_length(a) for a in element.iter("a"))
+
+def lxml_main_content(html):
+    """
+    Keeps only the main article body: each paragraph adds its text length to its
+    parent (and half to its grandparent), and the block with the highest score,
+    discounted by link density, wins. Falls back to the whole page.
+    """
+    root = _lxml_root(html)
+    scores = {}
+    for paragraph in root.iter("p", "pre", "blockquote", "li"):
+        length = _text_length(paragraph)
+        if length < 25:
+            continue
+        parent = paragraph.getparent()
+        for ancestor, weight in ((parent, 1.0), (parent.getparent() if parent is not None else None, 0.5)):
+            if ancestor is None or ancestor.tag not in _BLOCK_TAGS:
+                continue
+            scores[ancestor] = scores.get(ancestor, 0.0) + weight * (1 + length / 100)
+
+    best, best_score = None, 0.0
+    for element, score in scores.items():
+        hints = f"{element.get('class', '')} {element.get('id', '')}"
+        if _NEGATIVE_HINTS.search(hints):
+            score *= 0.2
+        if element.tag in ("article", "main"):
+            score *= 1.5
+        total = _text_length(element)
+        if total:
+            score *= 1 - min(_link_text_length(element) / total, 1.0)
+        if score > best_score:
+            best, best_score = element, score
+
+    if best is None:
+        return clean_text('\n'.join(_iter_strings(root)))
+    return clean_text('\n'.join(_iter_strings(best)))
+
+# --- Streaming tokenizer ---
+
+class StreamingTextExtractor(HTMLParser):
+    """
+    Incremental extractor: feed() it chunks of HTML as they arrive and call
+    finish() for the text. Boilerplate subtrees are discarded while parsing and
+    only the text strings are kept, so memory stays proportional to the text.
+    Unclosed tags are closed the way BeautifulSoup does (an end tag closes the
+    most recent open tag with the same name).
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._parts = []
+        self._open_tags = []
+        self._hidden_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            return
+        self._open_tags.append(tag)
+        if tag in BOILERPLATE_TAGS or tag in NON_TEXT_TAGS:
+            self._hidden_depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        pass
+
+    def handle_endtag(self, tag):
+        if tag not in self._open_tags:
+            return
+        while self._open_tags:
+            closed = self._open_tags.pop()
+            if closed in BOILERPLATE_TAGS or closed in NON_TEXT_TAGS:
+                self._hidden_depth -= 1
+            if closed == tag:
+                break
+
+    def handle_data(self, data):
+        if not self._hidden_depth:
+            self._parts.append(data)
+
+    def finish(self):
+        self.close()
+        return clean_text('\n'.join(self._parts))
@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from news_agent.scraper import extract_content
+
+# Seconds close() waits for requests still in flight after a deadline
+CLOSE_GRACE = 2.0
+
+
+class ScrapeEngine:
+    """
+    Scrapes a batch of URLs concurrently on top of extract_content.
+
+    Connections are pooled and kept alive per host through a shared
+    requests.Session, the number of in-flight requests per domain is capped,
+    and an overall deadline bounds the batch: URLs still pending when it
+    expires are skipped instead of blocking the run.
+    """
+
+    def __init__(self, max_workers=8, per_host_limit=2, deadline=60, timeout=10):
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.deadline = deadline
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max(max_workers, 10), pool_maxsize=per_host_limit)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._host_slots = {}
+        self._lock = threading.Lock()
+        # Requests using the session; close() waits for them before closing it
+        self._in_flight = 0
+        self._idle = threading.Condition(self._lock)
+        self._closed = False
+
+    def _slot(self, host):
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_slots[host]
+
+    def fetch(self, url, deadline_at=None):
+        """Scrapes a single URL, waiting for a free slot on its host until the deadline."""
+        host = urlsplit(url).hostname or ""
+        slot = self._slot(host)
+
+        if deadline_at is None:
+            slot.acquire()
+        else:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0 or not slot.acquire(timeout=remaining):
+                logging.warning(f"Deadline reached waiting for {host}, skipping {url}")
+                return ""
+
+        try:
+            timeout = self.timeout
+            if deadline_at is not None:
+                remaining = deadline_at - time.monotonic()
+                if remaining <= 0:
+                    return ""
+                timeout = min(timeout, remaining)
+            with self._lock:
+                if self._closed:
+                    return ""
+                self._in_flight += 1
+            try:
+                return extract_content(url, session=self.session, timeout=timeout)
+            finally:
+                with self._idle:
+                    self._in_flight -= 1
+                    self._idle.notify_all()
+        finally:
+            slot.release()
+
+    def scrape(self, urls, deadline=None):
+        """
+        Scrapes all URLs concurrently.
+        Returns a dict {url: text} with the URLs that produced content before the deadline.
+        """
+        deadline = self.deadline if deadline is None else deadline
+        unique_urls = list(dict.fromkeys(urls))
+        if not unique_urls:
+            return {}
+
+        start = time.monotonic()
+        deadline_at = start + deadline
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="scrape")
+        futures = {executor.submit(self.fetch, url, deadline_at): url for url in unique_urls}
+        done, not_done = wait(futures, timeout=deadline)
+        # Do not wait for requests still in flight; queued ones are cancelled.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        results = {}
+        for future in done:
+            try:
+                text = future.result()
+            except Exception as e:
+                logging.error(f"Failed to scrape {futures[future]}: {e}")
+                continue
+            if text:
+                results[futures[future]] = text
+
+        if not_done:
+            logging.warning(f"Scraping deadline of {deadline}s reached, skipped {len(not_done)} URLs.")
+        logging.info(f"Scraped {len(results)}/{len(unique_urls)} URLs in {time.monotonic() - start:.1f}s.")
+        return results
+
+    def close(self, grace=CLOSE_GRACE):
+        """Closes the session once in-flight requests finish, waiting at most 'grace' seconds."""
+        with self._idle:
+            self._closed = True
+            if not self._idle.wait_for(lambda: self._in_flight == 0, timeout=grace):
+                logging.warning(f"Closing the scraping session with {self._in_flight} request(s) still in flight.")
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
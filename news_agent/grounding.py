@@ -0,0 +1,177 @@
+"""
+Resultados de búsqueda a partir de las respuestas con grounding de Google Search.
+
+parse_grounding() lee grounding_metadata: cada grounding_chunk es una fuente
+(web.uri, web.title, web.domain) y cada grounding_support une un fragmento de la
+respuesta (segment.text) con las fuentes que lo respaldan y su confianza. Cada
+resultado lleva título, dominio, snippet (los fragmentos respaldados) y una
+puntuación (suma de confianzas), y se ordenan por ella.
+
+Vertex AI devuelve las fuentes como URLs de redirección
+(vertexaisearch.cloud.google.com/grounding-api-redirect/...): resolve_redirects()
+las resuelve todas a la vez con peticiones HEAD. Si la respuesta no trae metadatos,
+parse_text_urls() extrae las URLs del texto, como antes.
+"""
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+
+from news_agent.dedup import canonical_url
+from news_agent.scraper import HEADERS
+from news_agent.telemetry import bind_stage, count, span
+
+REDIRECT_HOSTS = {"vertexaisearch.cloud.google.com"}
+MAX_SNIPPET_CHARS = 300
+
+_URL = re.compile(r'https?://[^\s<>"]+|www\.[^\s<>"]+')
+_resolved = {}
+_resolved_lock = threading.Lock()
+
+
+def _bare(host):
+    return host[4:] if host.startswith("www.") else host
+
+
+def _domain(url):
+    return _bare(urlsplit(url if "://" in url else f"https://{url}").hostname or "")
+
+
+def title_from_url(url):
+    """Título aproximado a partir del slug de la URL ('apagon-masivo-en-la-habana' → 'Apagon masivo en la habana')."""
+    parts = urlsplit(url if "://" in url else f"https://{url}")
+    segments = [segment for segment in parts.path.split("/") if segment]
+    for segment in reversed(segments):
+        slug = re.sub(r"\.(s?html?|php|aspx?)$", "", segment)
+        words = [word for word in re.split(r"[-_+]+", slug) if word and not any(c.isdigit() for c in word)]
+        if len(words) >= 3:
+            return " ".join(words).capitalize()
+    return f"{parts.hostname or ''}{parts.path}".rstrip("/")
+
+
+def _is_placeholder_title(title, domain):
+    # Vertex AI suele poner como título el dominio de la fuente
+    title = (title or "").strip().lower()
+    return not title or " " not in title and ("." in title or title == domain)
+
+
+def parse_grounding(response, query=None):
+    """
+    Resultados de los grounding_chunks de la respuesta, ordenados por puntuación
+    (los sin respaldo al final, en su orden). Lista vacía si no hay metadatos.
+    """
+    candidates = getattr(response, "candidates", None) or []
+    metadata = getattr(candidates[0], "grounding_metadata", None) if candidates else None
+    chunks = getattr(metadata, "grounding_chunks", None) or []
+
+    results = []
+    by_chunk = {}
+    for index, chunk in enumerate(chunks):
+        web = getattr(chunk, "web", None)
+        if not web or not web.uri:
+            continue
+        title = web.title or ""
+        domain = (web.domain or "").lower()
+        derived = _is_placeholder_title(title, domain)
+        if derived:
+            domain = domain or title.lower()
+            if urlsplit(web.uri).hostname not in REDIRECT_HOSTS:
+                title = title_from_url(web.uri)
+        result = {
+            "title": title,
+            "url": web.uri,
+            "domain": _bare(domain) or _domain(web.uri),
+            "snippet": "",
+            "score": 0.0,
+            "query": query,
+            # El título no es el de la fuente: no identifica la noticia (news_agent.seen_store)
+            "derived_title": derived,
+            "_segments": [],
+        }
+        by_chunk[index] = result
+        results.append(result)
+
+    for support in getattr(metadata, "grounding_supports", None) or []:
+        text = (support.segment.text or "").strip() if support.segment else ""
+        indices = support.grounding_chunk_indices or []
+        scores = support.confidence_scores or []
+        for n, index in enumerate(indices):
+            result = by_chunk.get(index)
+            if result is None:
+                continue
+            # Sin confidence_scores (Gemini 2.x) cada respaldo cuenta 1
+            result["score"] += scores[n] if n < len(scores) else 1.0
+            if text and text not in result["_segments"]:
+                result["_segments"].append(text)
+
+    for result in results:
+        result["snippet"] = " ".join(result.pop("_segments"))[:MAX_SNIPPET_CHARS]
+        result["score"] = round(result["score"], 4)
+    results.sort(key=lambda result: -result["score"])
+    return results
+
+
+def parse_text_urls(text, query=None):
+    """Resultados a partir de las URLs que aparecen en el texto de la respuesta (sin metadatos)."""
+    results = []
+    seen_urls = set()
+    for url in _URL.findall(text or ""):
+        url = url.strip().rstrip(').,')
+        if canonical_url(url) not in seen_urls:
+            seen_urls.add(canonical_url(url))
+            # El texto es el mismo para todas las URLs: el título sale de la URL
+            results.append({"title": title_from_url(url), "url": url, "domain": _domain(url),
+                            "snippet": "", "score": 0.0, "query": query, "derived_title": True})
+    return results
+
+
+def _resolve(url, session, timeout):
+    with _resolved_lock:
+        if url in _resolved:
+            return _resolved[url]
+    try:
+        with span("http.resolve"):
+            response = session.head(url, headers=HEADERS, allow_redirects=False, timeout=timeout)
+    except requests.RequestException as e:
+        # Se conserva la URL de redirección (la extracción sigue las redirecciones)
+        # y no se memoriza: un error transitorio se reintenta en la próxima búsqueda
+        logging.warning(f"No se pudo resolver {url}: {e}")
+        return url
+    if not response.is_redirect or not response.headers.get("Location"):
+        return url
+    target = requests.compat.urljoin(url, response.headers["Location"])
+    with _resolved_lock:
+        _resolved[url] = target
+    return target
+
+
+def resolve_redirects(results, max_workers=8, timeout=5, session=None):
+    """
+    Sustituye a la vez las URLs de redirección de grounding por su destino y
+    completa dominio y título (si era solo el dominio). Devuelve 'results'.
+    """
+    pending = [result for result in results if urlsplit(result["url"]).hostname in REDIRECT_HOSTS]
+    if not pending:
+        return results
+    own_session = session is None
+    session = session or requests.Session()
+    resolve = bind_stage(_resolve)
+    try:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as executor:
+            targets = list(executor.map(lambda result: resolve(result["url"], session, timeout), pending))
+    finally:
+        if own_session:
+            session.close()
+    for result, target in zip(pending, targets):
+        if target == result["url"]:
+            continue
+        result["url"] = target
+        domain = _domain(target)
+        if _is_placeholder_title(result["title"], result.get("domain")):
+            result["title"] = title_from_url(target)
+        result["domain"] = domain
+    count("grounding_redirects", len(pending))
+    return results
@@ -0,0 +1,122 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from news_agent.embedding_cache import DEFAULT_CACHE_DIR
+
+# Default freshness of a cached page, in seconds
+DEFAULT_TTL = 3600
+# Per-URL TTL overrides, matched by URL prefix. Exchange-rate pages change during the day.
+TTL_RULES = [
+    ("https://www.martinoticias.com/tasa-de-cambio", 600),
+    ("https://eltoque.com/tasas-de-cambio", 600),
+]
+# Entries not revalidated for this long are dropped when the cache is opened
+MAX_ENTRY_AGE = 7 * 24 * 3600
+
+CachedPage = namedtuple("CachedPage", ["url", "text", "etag", "last_modified", "fetched_at", "ttl"])
+
+class HttpCache:
+    """
+    Disk-backed cache of scraped pages.
+    Stores the extracted text together with the ETag/Last-Modified validators,
+    so a fresh hit skips both the download and the HTML parsing, and a stale
+    entry can be revalidated with a conditional request.
+    """
+
+    def __init__(self, path, default_ttl=DEFAULT_TTL, ttl_rules=None):
+        self.path = path
+        self.default_ttl = default_ttl
+        self.ttl_rules = TTL_RULES if ttl_rules is None else ttl_rules
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, text TEXT NOT NULL, etag TEXT, last_modified TEXT, fetched_at REAL NOT NULL)"
+        )
+        self._db.execute("DELETE FROM pages WHERE fetched_at < ?", (time.time() - MAX_ENTRY_AGE,))
+        self._db.commit()
+
+    def ttl_for(self, url):
+        for prefix, ttl in self.ttl_rules:
+            if url.startswith(prefix):
+                return ttl
+        return self.default_ttl
+
+    def get(self, url):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, text, etag, last_modified, fetched_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if not row:
+            return None
+        return CachedPage(*row, ttl=self.ttl_for(url))
+
+    def is_fresh(self, page):
+        return time.time() - page.fetched_at < page.ttl
+
+    def conditional_headers(self, page):
+        headers = {}
+        if page.etag:
+            headers["If-None-Match"] = page.etag
+        if page.last_modified:
+            headers["If-Modified-Since"] = page.last_modified
+        return headers
+
+    def store(self, url, text, etag=None, last_modified=None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (url, text, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (url, text, etag, last_modified, time.time())
+            )
+            self._db.commit()
+
+    def touch(self, url):
+        """Marks an entry as fresh again after a 304 Not Modified."""
+        with self._lock:
+            self._db.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+
+    def record(self, result):
+        """Counts the outcome of a lookup: "hit", "revalidated" or "miss" (called from many threads)."""
+        with self._lock:
+            if result == "hit":
+                self.hits += 1
+            elif result == "revalidated":
+                self.revalidated += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        return {"hits": self.hits, "revalidated": self.revalidated, "misses": self.misses}
+
+    def close(self):
+        self._db.close()
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_default_cache():
+    """
+    Returns the process-wide page cache, or None if disabled with NEWS_AGENT_HTTP_CACHE=false
+    or if the cache directory is not writable.
+    """
+    global _default_cache
+    if os.environ.get("NEWS_AGENT_HTTP_CACHE", "true").lower() != "true":
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            cache_dir = os.environ.get("NEWS_AGENT_CACHE_DIR", DEFAULT_CACHE_DIR)
+            try:
+                _default_cache = HttpCache(os.path.join(cache_dir, "http.sqlite3"))
+            except (OSError, sqlite3.Error) as e:
+                logging.warning(f"HTTP cache disabled, could not open it in {cache_dir}: {e}")
+                _default_cache = False
+        return _default_cache or None
@@ -0,0 +1,167 @@
+import logging
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+import pytz
+import requests
+
+from news_agent.scraper import HEADERS, extract_content
+from news_agent.telemetry import bind_stage, span
+
+# Menciones del tipo "USD a 440", "1 EUR 485 CUP", "50 euros a 490"
+RATE_PATTERN = re.compile(
+    r"\b(USD|EUR|EUROS?|MLC|D[OÓ]LAR(?:ES)?)\b[^\d]{0,25}?(\d{2,4}(?:[.,]\d{1,2})?)\b",
+    re.IGNORECASE
+)
+CURRENCY_ALIASES = {"EURO": "EUR", "EUROS": "EUR", "DOLAR": "USD", "DÓLAR": "USD", "DOLARES": "USD", "DÓLARES": "USD"}
+# Rango plausible de una tasa en CUP; descarta importes ("100 USD") y años
+MIN_RATE, MAX_RATE = 50, 2000
+# Monedas que hacen válido un registro
+REQUIRED_CURRENCIES = ("USD", "EUR")
+
+DEFAULT_TTL = 600
+CHUNK_SIZE = 16 * 1024
+
+def parse_rates(text):
+    """
+    Extrae las tasas {moneda: tasa en CUP} de un texto. Cuando una moneda aparece
+    varias veces (anuncios de compra/venta), se usa la mediana de sus valores.
+    """
+    values = {}
+    for currency, amount in RATE_PATTERN.findall(text or ""):
+        currency = currency.upper()
+        currency = CURRENCY_ALIASES.get(currency, currency)
+        rate = float(amount.replace(",", "."))
+        if MIN_RATE <= rate <= MAX_RATE:
+            values.setdefault(currency, []).append(rate)
+    return {currency: round(statistics.median(rates), 2) for currency, rates in values.items()}
+
+class TextRateSource:
+    """Página web cuyo texto contiene las tasas de cambio."""
+
+    def __init__(self, name, url, priority, timeout=10):
+        self.name = name
+        self.url = url
+        self.priority = priority
+        self.timeout = timeout
+
+    def fetch(self, cancel=None, timeout=None):
+        """Registro de la fuente, o None. Con 'cancel' activado no se descarga ni se analiza nada más."""
+        if cancel is not None and cancel.is_set():
+            return None
+        text = extract_content(self.url, timeout=min(self.timeout, timeout or self.timeout))
+        if cancel is not None and cancel.is_set():
+            return None
+        rates = parse_rates(text)
+        if not any(currency in rates for currency in REQUIRED_CURRENCIES):
+            logging.info(f"{self.name} no proporcionó tasas reconocibles.")
+            return None
+        return {"source": self.name, "url": self.url, "rates": rates, "image": None,
+                "fetched_at": datetime.now(pytz.utc)}
+
+class ImageRateSource:
+    """Imagen con las tasas de cambio; se pasa tal cual al modelo."""
+
+    def __init__(self, name, url, priority, timeout=10):
+        self.name = name
+        self.url = url
+        self.priority = priority
+        self.timeout = timeout
+
+    def fetch(self, cancel=None, timeout=None):
+        """Registro con la imagen, o None. Con 'cancel' activado la descarga se interrumpe entre bloques."""
+        if cancel is not None and cancel.is_set():
+            return None
+        timeout = min(self.timeout, timeout or self.timeout)
+        with span("http.get"), requests.get(self.url, headers=HEADERS, timeout=timeout, stream=True) as response:
+            if response.status_code != 200:
+                logging.warning(f"No se pudo descargar imagen de {self.name}: {response.status_code}")
+                return None
+            chunks = []
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if cancel is not None and cancel.is_set():
+                    return None
+                chunks.append(chunk)
+        return {"source": self.name, "url": self.url, "rates": {}, "image": b"".join(chunks),
+                "fetched_at": datetime.now(pytz.utc)}
+
+# Menor número = mayor prioridad
+SOURCES = [
+    TextRateSource("Martí Noticias", "https://www.martinoticias.com/tasa-de-cambio-de-moneda-cuba-hoy", 0),
+    TextRateSource("El Toque", "https://eltoque.com/tasas-de-cambio-de-moneda-en-cuba-hoy", 1),
+    ImageRateSource("CambioCuba", "https://wa.cambiocuba.money/trmi.png", 2),
+]
+
+_cache = {"record": None, "expires": 0.0}
+_cache_lock = threading.Lock()
+
+def get_economic_indicators(sources=None, accept_priority=1, timeout=20, ttl=DEFAULT_TTL):
+    """
+    Consulta todas las fuentes a la vez y devuelve el primer registro válido:
+    uno con prioridad <= 'accept_priority' se acepta en cuanto llega; uno de menor
+    prioridad solo cuando ya no queda pendiente ninguna fuente mejor. Las fuentes
+    restantes se cancelan: las que no han empezado no se ejecutan y las que están
+    en curso dejan de descargar en el siguiente bloque (o descartan la respuesta);
+    ninguna petición dura más que 'timeout'. El registro se guarda en cache durante 'ttl' segundos.
+    Devuelve None si ninguna fuente responde a tiempo.
+    """
+    with _cache_lock:
+        if _cache["record"] is not None and time.monotonic() < _cache["expires"]:
+            logging.info(f"Indicadores económicos desde cache ({_cache['record']['source']}).")
+            return _cache["record"]
+
+    sources = SOURCES if sources is None else sources
+    executor = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="rates")
+    cancel = threading.Event()
+    pending = {executor.submit(bind_stage(source.fetch), cancel, timeout): source for source in sources}
+    deadline = time.monotonic() + timeout
+    best = None  # (prioridad, registro)
+
+    try:
+        while pending:
+            done, _ = wait(pending, timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                logging.warning(f"Timeout de {timeout}s esperando indicadores económicos.")
+                break
+            for future in done:
+                source = pending.pop(future)
+                try:
+                    record = future.result()
+                except Exception as e:
+                    logging.error(f"Error al obtener indicadores de {source.name}: {e}")
+                    continue
+                if record and (best is None or source.priority < best[0]):
+                    best = (source.priority, record)
+
+            if best is not None:
+                better_pending = any(source.priority < best[0] for source in pending.values())
+                if best[0] <= accept_priority or not better_pending:
+                    break
+    finally:
+        # Las fuentes que siguen en curso no se esperan: se les avisa de que paren
+        cancel.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if best is None:
+        logging.warning("Ninguna fuente proporcionó indicadores económicos.")
+        return None
+
+    record = best[1]
+    logging.info(f"Indicadores económicos obtenidos de {record['source']}: {record['rates'] or 'imagen'}")
+    with _cache_lock:
+        _cache["record"] = record
+        _cache["expires"] = time.monotonic() + ttl
+    return record
+
+def format_rates(record):
+    """Texto compacto con las tasas de un registro, para prompts y herramientas."""
+    if not record:
+        return "Tasas de cambio no disponibles hoy."
+    if not record["rates"]:
+        return f"Tasas de cambio en imagen: {record['url']}"
+    rates = "; ".join(f"1 {currency} = {rate:g} CUP" for currency, rate in sorted(record["rates"].items()))
+    return f"Tasas de cambio del mercado informal (fuente: {record['source']}): {rates}"
@@ -0,0 +1,72 @@
+"""Parser incremental para extraer el valor de un campo de texto de un JSON que llega en trozos."""
+import re
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class JsonStringFieldStream:
+    """
+    Recibe los trozos de una respuesta JSON en streaming y devuelve, en cuanto
+    llegan, los fragmentos ya decodificados del valor de texto de 'field'.
+    Ejemplo: para '{"summary_html": "<h1>Hola</h1>", ...}' emite '<h1>Hola</h1>'
+    aunque llegue partido en varios trozos.
+    """
+
+    def __init__(self, field):
+        self._key = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buffer = ""
+        self._in_value = False
+        self.done = False
+
+    def feed(self, chunk):
+        """Añade un trozo y devuelve el texto nuevo del campo (puede ser "")."""
+        if self.done:
+            return ""
+        self._buffer += chunk
+        if not self._in_value:
+            match = self._key.search(self._buffer)
+            if not match:
+                # Conserva solo lo necesario para detectar la clave partida entre trozos
+                self._buffer = self._buffer[-256:]
+                return ""
+            self._buffer = self._buffer[match.end():]
+            self._in_value = True
+        return self._decode()
+
+    def _decode(self):
+        out = []
+        text = self._buffer
+        i = 0
+        while i < len(text):
+            char = text[i]
+            if char == '"':
+                self.done = True
+                i += 1
+                break
+            if char != '\\':
+                out.append(char)
+                i += 1
+                continue
+            # Secuencia de escape: esperar a tenerla completa
+            if i + 1 >= len(text):
+                break
+            kind = text[i + 1]
+            if kind != 'u':
+                out.append(_ESCAPES.get(kind, kind))
+                i += 2
+                continue
+            if i + 6 > len(text):
+                break
+            code = int(text[i + 2:i + 6], 16)
+            if 0xD800 <= code < 0xDC00:
+                # Par sustituto: necesita el segundo \uXXXX
+                if i + 12 > len(text):
+                    break
+                low = int(text[i + 8:i + 12], 16)
+                out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                i += 12
+            else:
+                out.append(chr(code))
+                i += 6
+        self._buffer = text[i:]
+        return "".join(out)
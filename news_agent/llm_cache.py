@@ -0,0 +1,226 @@
+"""
+Cache determinista de respuestas de Gemini con modo grabación/reproducción.
+
+CachingGenAIClient envuelve un genai.Client y guarda las respuestas de
+generate_content, generate_content_stream y embed_content con clave
+(método, modelo, hash de contents, config). Modos (NEWS_AGENT_LLM_CACHE):
+- "off": sin cache (por defecto).
+- "cache": reutiliza respuestas de menos de NEWS_AGENT_LLM_CACHE_TTL segundos.
+- "record": llama siempre al modelo y guarda la respuesta.
+- "replay": solo responde desde la cache, sin red; un fallo lanza ReplayMissError.
+"""
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from google import genai
+from google.genai import types
+from pydantic import BaseModel
+
+from news_agent.embedding_cache import DEFAULT_CACHE_DIR
+from news_agent.telemetry import TracedGenAIClient
+
+MODES = ("off", "cache", "record", "replay")
+DEFAULT_TTL = 24 * 3600
+
+_RESPONSE_TYPES = {
+    "generate_content": types.GenerateContentResponse,
+    "generate_content_stream": types.GenerateContentResponse,
+    "embed_content": types.EmbedContentResponse,
+}
+
+
+class ReplayMissError(LookupError):
+    """La llamada no está grabada y el modo replay no permite ir a la red."""
+
+
+def _canonical(value):
+    """Representación JSON estable de contents/config para calcular la clave."""
+    if isinstance(value, BaseModel):
+        return _canonical(value.model_dump(exclude_none=True))
+    if inspect.isclass(value) and issubclass(value, BaseModel):
+        return value.model_json_schema()
+    if isinstance(value, (bytes, bytearray)):
+        return {"sha256": hashlib.sha256(value).hexdigest()}
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in sorted(value.items(), key=lambda item: str(item[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return repr(value)
+
+
+def make_key(method, model, contents, config=None):
+    payload = json.dumps([method, model, _canonical(contents), _canonical(config)],
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _dump(response):
+    # 'parsed' se reconstruye a partir del texto al validar contra el esquema
+    return response.model_dump(mode="json", exclude_none=True, exclude={"parsed"})
+
+
+class ResponseStore:
+    """Respuestas grabadas en SQLite: clave -> JSON de la respuesta (o lista de trozos)."""
+
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, method TEXT NOT NULL, model TEXT, payload TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, key, max_age=None):
+        """Payload guardado para 'key', o None si no existe o tiene más de 'max_age' segundos."""
+        with self._lock:
+            row = self._db.execute("SELECT payload, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and (max_age is None or time.time() - row[1] < max_age):
+                self.hits += 1
+                return json.loads(row[0])
+            self.misses += 1
+            return None
+
+    def put(self, key, method, model, payload):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, method, model, payload, created) VALUES (?, ?, ?, ?, ?)",
+                (key, method, model, json.dumps(payload, ensure_ascii=False), time.time())
+            )
+            self._db.commit()
+            self.stored += 1
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "stored": self.stored}
+
+    def close(self):
+        self._db.close()
+
+
+class _CachingModels:
+    def __init__(self, models, store, mode):
+        self._models = models
+        self._store = store
+        self._mode = mode
+
+    def _lookup(self, method, model, contents, config):
+        key = make_key(method, model, contents, config)
+        if self._mode == "record":
+            return key, None
+        payload = self._store.get(key, max_age=None if self._mode == "replay" else self._store.ttl)
+        if payload is None and self._mode == "replay":
+            raise ReplayMissError(f"Llamada {method} a {model} no grabada (clave {key[:12]}).")
+        return key, payload
+
+    def _call(self, method, model, contents, config, **kwargs):
+        response_type = _RESPONSE_TYPES[method]
+        key, payload = self._lookup(method, model, contents, config)
+        if payload is not None:
+            return response_type.model_validate(payload)
+        response = getattr(self._models, method)(model=model, contents=contents, config=config, **kwargs)
+        self._store.put(key, method, model, _dump(response))
+        return response
+
+    def generate_content(self, *, model, contents, config=None, **kwargs):
+        return self._call("generate_content", model, contents, config, **kwargs)
+
+    def embed_content(self, *, model, contents, config=None, **kwargs):
+        return self._call("embed_content", model, contents, config, **kwargs)
+
+    def generate_content_stream(self, *, model, contents, config=None, **kwargs):
+        key, payload = self._lookup("generate_content_stream", model, contents, config)
+        if payload is not None:
+            for chunk in payload:
+                yield types.GenerateContentResponse.model_validate(chunk)
+            return
+        chunks = []
+        for chunk in self._models.generate_content_stream(model=model, contents=contents, config=config, **kwargs):
+            chunks.append(_dump(chunk))
+            yield chunk
+        # Solo se guarda la respuesta completa
+        self._store.put(key, "generate_content_stream", model, chunks)
+
+    def __getattr__(self, name):
+        if self._models is None:
+            raise ReplayMissError(f"models.{name} no está disponible en modo replay.")
+        return getattr(self._models, name)
+
+
+class CachingGenAIClient:
+    """
+    Envoltorio de genai.Client con la cache de respuestas en 'client.models'.
+    En modo replay 'client' puede ser None: no hace falta credencial ni red.
+    """
+
+    def __init__(self, client, store, mode="cache"):
+        if mode not in MODES or mode == "off":
+            raise ValueError(f"Modo de cache LLM no válido: {mode}")
+        self.client = client
+        self.store = store
+        self.mode = mode
+        self.models = _CachingModels(client.models if client is not None else None, store, mode)
+
+    def __getattr__(self, name):
+        if self.client is None:
+            raise ReplayMissError(f"client.{name} no está disponible en modo replay.")
+        return getattr(self.client, name)
+
+
+def cache_mode():
+    mode = os.environ.get("NEWS_AGENT_LLM_CACHE", "off").lower()
+    if mode not in MODES:
+        logging.warning(f"NEWS_AGENT_LLM_CACHE='{mode}' no válido, cache LLM desactivada.")
+        return "off"
+    return mode
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_store():
+    """
+    Almacén de respuestas compartido por todo el proceso, en NEWS_AGENT_LLM_CACHE_PATH
+    (por defecto NEWS_AGENT_CACHE_DIR/llm.sqlite3).
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            path = os.environ.get("NEWS_AGENT_LLM_CACHE_PATH") or os.path.join(
+                os.environ.get("NEWS_AGENT_CACHE_DIR", DEFAULT_CACHE_DIR), "llm.sqlite3")
+            ttl = int(os.environ.get("NEWS_AGENT_LLM_CACHE_TTL", DEFAULT_TTL))
+            _default_store = ResponseStore(path, ttl=ttl)
+        return _default_store
+
+
+def create_client(**client_kwargs):
+    """
+    Crea un genai.Client con 'client_kwargs' envuelto según NEWS_AGENT_LLM_CACHE.
+    Las llamadas que llegan al modelo se miden (news_agent.telemetry); en modo
+    replay no se crea el cliente real.
+    """
+    mode = cache_mode()
+    if mode == "off":
+        return TracedGenAIClient(genai.Client(**client_kwargs))
+    client = None if mode == "replay" else TracedGenAIClient(genai.Client(**client_kwargs))
+    logging.info(f"Cache LLM en modo '{mode}'.")
+    return CachingGenAIClient(client, get_default_store(), mode=mode)
+
+
+def cache_stats(client):
+    """Contadores de la cache de un cliente creado con create_client (None si no tiene cache)."""
+    return client.store.stats() if isinstance(client, CachingGenAIClient) else None
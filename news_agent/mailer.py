@@ -2,23 +2,42 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import logging
+import os
 
-def send_email(user_email, user_password, subject, body, to_email=None, bcc_emails=None, is_html=False):
+from news_agent.telemetry import span
+
+def smtp_settings(host=None, port=None, starttls=None):
+    """SMTP server to use: arguments first, then SMTP_HOST/SMTP_PORT/SMTP_STARTTLS, then Gmail."""
+    host = host or os.environ.get("SMTP_HOST", "smtp.gmail.com")
+    port = int(port or os.environ.get("SMTP_PORT", 587))
+    if starttls is None:
+        starttls = os.environ.get("SMTP_STARTTLS", "true").lower() == "true"
+    return host, port, starttls
+
+def build_message(from_email, to_email, subject, body, is_html=False):
+    msg = MIMEMultipart()
+    msg['From'] = from_email
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    
+    mime_type = 'html' if is_html else 'plain'
+    msg.attach(MIMEText(body, mime_type, 'utf-8'))
+    return msg
+
+def send_email(user_email, user_password, subject, body, to_email=None, bcc_emails=None, is_html=False,
+               host=None, port=None, starttls=None):
     """
     Sends an email using Gmail SMTP.
+    The server can be changed with SMTP_HOST, SMTP_PORT and SMTP_STARTTLS (e.g. a local sink).
+    For newsletters to many recipients use news_agent.delivery.
     """
+    host, port, starttls = smtp_settings(host, port, starttls)
     if to_email is None:
         to_email = user_email
         
     logging.info(f"Sending email to {to_email} (BCC: {bcc_emails})...")
     
-    msg = MIMEMultipart()
-    msg['From'] = user_email
-    msg['To'] = to_email
-    msg['Subject'] = subject
-    
-    mime_type = 'html' if is_html else 'plain'
-    msg.attach(MIMEText(body, mime_type, 'utf-8'))
+    msg = build_message(user_email, to_email, subject, body, is_html=is_html)
     
     # Prepare list of all recipients for SMTP
     all_recipients = [to_email]
@@ -29,11 +48,13 @@ def send_email(user_email, user_password, subject, body, to_email=None, bcc_emai
             all_recipients.extend(bcc_emails)
     
     try:
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(user_email, user_password)
-        server.sendmail(user_email, all_recipients, msg.as_string())
-        server.quit()
+        with span("smtp.send"):
+            server = smtplib.SMTP(host, port)
+            if starttls:
+                server.starttls()
+            server.login(user_email, user_password)
+            server.sendmail(user_email, all_recipients, msg.as_string())
+            server.quit()
         logging.info("Email sent successfully.")
         return True
     except Exception as e:
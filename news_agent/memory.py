@@ -1,37 +1,73 @@
 import logging
 import os
+import threading
 from google.cloud import firestore
+from google.cloud.firestore_v1.base_vector_query import DistanceMeasure
 from google.cloud.firestore_v1.vector import Vector
 from datetime import datetime, timedelta
 import pytz
-from google import genai
+from concurrent.futures import ThreadPoolExecutor
+from news_agent.digest import format_topic_digest
+from news_agent.embedding_cache import EmbeddingCache
+from news_agent.providers import get_firestore_client, get_genai_client
+from news_agent.telemetry import bind_stage, span
+
+EMBEDDING_MODEL = "text-embedding-004"
+# Máximo de textos por petición a embed_content
+EMBED_BATCH_SIZE = 100
 
 class NewsMemory:
-    def __init__(self, collection_name="news_agent_memory", api_key=None):
-        self.db = firestore.Client()
+    def __init__(self, collection_name="news_agent_memory", api_key=None, use_local_index=None, embedding_cache=None,
+                 db=None, genai_client=None):
+        # 'db' y 'genai_client' permiten usar otros clientes (p. ej. los de benchmarks/fakes.py);
+        # por defecto se usan los compartidos de news_agent.providers
+        self.db = db if db is not None else get_firestore_client()
         self.collection_name = collection_name
         self.collection_ref = self.db.collection(self.collection_name)
         self.topics_collection_ref = self.db.collection(f"{self.collection_name}_topics")
         
-        if api_key:
-            self.genai_client = genai.Client(api_key=api_key)
+        if genai_client is not None:
+            self.genai_client = genai_client
+        elif api_key:
+            self.genai_client = get_genai_client(api_key)
             logging.info("NewsMemory: GenAI Client inicializado con API Key.")
         else:
-            project_id = os.environ.get("GOOGLE_CLOUD_PROJECT")
-            self.genai_client = genai.Client(vertexai=True, project=project_id, location="us-central1")
-            logging.info(f"NewsMemory: GenAI Client inicializado con Vertex AI (Project: {project_id}).")
+            self.genai_client = get_genai_client()
+            logging.info(f"NewsMemory: GenAI Client inicializado con Vertex AI (Project: {os.environ.get('GOOGLE_CLOUD_PROJECT')}).")
+            
+        # Cache de embeddings (memoria + disco) para no repetir llamadas por el mismo texto
+        self.embedding_cache = embedding_cache if embedding_cache is not None else EmbeddingCache.from_env()
+        
+        # Índice vectorial local (opcional): se carga una vez por ejecución
+        if use_local_index is None:
+            use_local_index = os.environ.get("NEWS_AGENT_LOCAL_INDEX", "false").lower() == "true"
+        self.use_local_index = use_local_index
+        self._local_index = None
+        self._local_index_lock = threading.Lock()
             
         logging.info(f"Conectado a Firestore, colección: {self.collection_name}")
 
-    def get_recent_summaries(self, days=3):
-        """Recupera los resúmenes de los últimos 'days' días."""
+    def get_local_index(self):
+        """Devuelve el índice vectorial local, cargándolo desde Firestore la primera vez."""
+        with self._local_index_lock:
+            if self._local_index is None:
+                from news_agent.vector_index import LocalVectorIndex
+                with span("firestore.load_index"):
+                    self._local_index = LocalVectorIndex.from_collection(self.topics_collection_ref)
+            return self._local_index
+
+    def get_recent_summaries(self, days=3, limit=20, fields=("timestamp", "topics_covered")):
+        """
+        Recupera los resúmenes de los últimos 'days' días (como máximo 'limit').
+        Solo se leen los campos de 'fields' (proyección), no el HTML completo.
+        """
         try:
             cutoff_date = datetime.now(pytz.utc) - timedelta(days=days)
-            docs = self.collection_ref.where("timestamp", ">=", cutoff_date).order_by("timestamp", direction=firestore.Query.DESCENDING).stream()
-            
-            summaries = []
-            for doc in docs:
-                summaries.append(doc.to_dict())
+            query = self.collection_ref.where("timestamp", ">=", cutoff_date).order_by("timestamp", direction=firestore.Query.DESCENDING)
+            if fields:
+                query = query.select(list(fields))
+            with span("firestore.query"):
+                summaries = [doc.to_dict() for doc in query.limit(limit).stream()]
             
             logging.info(f"Recuperados {len(summaries)} resúmenes de los últimos {days} días.")
             return summaries
@@ -39,80 +75,143 @@ class NewsMemory:
             logging.error(f"Error al recuperar resúmenes de Firestore: {e}")
             return []
 
+    def get_topic_digest(self, days=3, limit=20, max_topics=30):
+        """Devuelve un resumen compacto de los temas cubiertos en los últimos 'days' días."""
+        return format_topic_digest(self.get_recent_summaries(days=days, limit=limit), max_topics=max_topics)
+
     def save_summary(self, topics_covered, summary_text, news_hash):
-        """Guarda un nuevo resumen y sus temas con embeddings en Firestore."""
+        """
+        Guarda un nuevo resumen y sus temas con embeddings en Firestore.
+        Todos los embeddings se generan en una sola petición y el resumen y sus temas
+        se escriben en un único WriteBatch, de modo que se guardan todos o ninguno.
+        Devuelve {"summary_id": ..., "topic_ids": [...]} o None si falla.
+        """
         try:
             timestamp = datetime.now(pytz.utc)
+            topics_covered = list(topics_covered or [])
+            
+            # 1. Generar embeddings de todos los temas a la vez
+            embeddings = self.embed_texts(topics_covered) if topics_covered else []
             
-            # 1. Guardar el resumen principal
-            data = {
+            # 2. Escribir resumen y temas en un único batch atómico
+            batch = self.db.batch()
+            doc_ref = self.collection_ref.document()
+            batch.set(doc_ref, {
                 "timestamp": timestamp,
                 "topics_covered": topics_covered,
                 "summary_text": summary_text,
                 "news_hash": news_hash
-            }
-            doc_ref = self.collection_ref.add(data)[1] # Get DocumentReference
-            summary_id = doc_ref.id
+            })
+            
+            topic_ids = []
+            for topic, embedding in zip(topics_covered, embeddings):
+                topic_ref = self.topics_collection_ref.document()
+                batch.set(topic_ref, {
+                    "topic": topic,
+                    "embedding": Vector(embedding),
+                    "timestamp": timestamp,
+                    "summary_id": doc_ref.id
+                })
+                topic_ids.append(topic_ref.id)
+            
+            with span("firestore.commit"):
+                batch.commit()
             
-            # 2. Generar embeddings y guardar temas individualmente
-            if topics_covered:
-                for topic in topics_covered:
-                    try:
-                        result = self.genai_client.models.embed_content(
-                            model="text-embedding-004",
-                            contents=topic
-                        )
-                        embedding = result.embeddings[0].values
-                        
-                        self.topics_collection_ref.add({
-                            "topic": topic,
-                            "embedding": Vector(embedding),
-                            "timestamp": timestamp,
-                            "summary_id": summary_id
-                        })
-                    except Exception as e:
-                        logging.error(f"Error al generar embedding para tema '{topic}': {e}")
+            if self._local_index is not None and topics_covered:
+                self._local_index.add(topics_covered, embeddings)
             
-            logging.info("Resumen y temas guardados exitosamente en Firestore.")
-            return True
+            logging.info(f"Resumen y {len(topic_ids)} temas guardados exitosamente en Firestore.")
+            return {"summary_id": doc_ref.id, "topic_ids": topic_ids}
         except Exception as e:
             logging.error(f"Error al guardar resumen en Firestore: {e}")
-            return False
+            return None
 
-    def find_similar_topics(self, topic_text, limit=5, threshold=0.8):
-        """Busca temas similares usando búsqueda vectorial en Firestore."""
-        try:
-            # 1. Generar embedding para el tema de búsqueda
+    def embed_texts(self, texts):
+        """
+        Genera los embeddings de varios textos con el mínimo número de peticiones.
+        Los textos ya presentes en la cache de embeddings no generan llamadas.
+        """
+        cache = self.embedding_cache
+        embeddings = cache.get_many(EMBEDDING_MODEL, texts) if cache else [None] * len(texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        
+        for start in range(0, len(missing), EMBED_BATCH_SIZE):
+            batch = missing[start:start + EMBED_BATCH_SIZE]
             result = self.genai_client.models.embed_content(
-                model="text-embedding-004",
-                contents=topic_text
+                model=EMBEDDING_MODEL,
+                contents=[texts[i] for i in batch]
             )
-            query_embedding = result.embeddings[0].values
-            
-            # 2. Realizar búsqueda vectorial en Firestore
-            # Nota: Requiere un índice vectorial creado en Firestore.
-            # Si no existe, esto fallará. En ese caso, se podría hacer fallback a búsqueda manual (lento).
-            from google.cloud.firestore_v1.vector import Vector
-            from google.cloud.firestore_v1.base_vector_query import DistanceMeasure
-            
-            collection_ref = self.topics_collection_ref
-            
-            # Búsqueda vectorial (KNN)
-            results = collection_ref.find_nearest(
-                vector_field="embedding",
-                query_vector=Vector(query_embedding),
-                distance_measure=DistanceMeasure.COSINE,
-                limit=limit
-            ).stream()
-            
-            similar_topics = []
-            for doc in results:
-                # Firestore no devuelve la distancia directamente en el doc de forma fácil en todas las versiones,
-                # pero los resultados están ordenados por proximidad.
+            values = [e.values for e in result.embeddings]
+            for i, embedding in zip(batch, values):
+                embeddings[i] = embedding
+            if cache:
+                cache.put_many(EMBEDDING_MODEL, [texts[i] for i in batch], values)
+        return embeddings
+
+    def _nearest_topics(self, query_embedding, limit, threshold=None):
+        """
+        Búsqueda vectorial (KNN) en Firestore.
+        Devuelve una lista de (tema, similitud coseno) ordenada por proximidad.
+        """
+        # Nota: Requiere un índice vectorial creado en Firestore.
+        query = self.topics_collection_ref.find_nearest(
+            vector_field="embedding",
+            query_vector=Vector(query_embedding),
+            distance_measure=DistanceMeasure.COSINE,
+            limit=limit,
+            distance_result_field="vector_distance",
+            # La distancia coseno es 1 - similitud
+            distance_threshold=None if threshold is None else 1 - threshold
+        )
+        
+        similar_topics = []
+        with span("firestore.find_nearest"):
+            for doc in query.stream():
                 data = doc.to_dict()
-                similar_topics.append(data["topic"])
-            
-            return similar_topics
-        except Exception as e:
-            logging.warning(f"Búsqueda vectorial falló (posiblemente falta índice): {e}")
+                similar_topics.append((data["topic"], 1 - data["vector_distance"]))
+        return similar_topics
+
+    def find_similar_topics(self, topic_text, limit=5, threshold=0.8):
+        """Busca temas similares usando búsqueda vectorial en Firestore."""
+        return self.find_similar_topics_batch([topic_text], limit=limit, threshold=threshold)[0]
+
+    def find_similar_topics_batch(self, topic_texts, limit=5, threshold=0.8, max_workers=8):
+        """
+        Busca temas similares para varios textos a la vez.
+        Devuelve una lista de listas de temas, en el mismo orden que 'topic_texts'.
+        """
+        scored = self.find_similar_topics_scored(topic_texts, limit=limit, threshold=threshold, max_workers=max_workers)
+        return [[topic for topic, _ in similar] for similar in scored]
+
+    def find_similar_topics_scored(self, topic_texts, limit=5, threshold=0.8, max_workers=8):
+        """
+        Como find_similar_topics_batch, pero devuelve pares (tema, similitud) con
+        similitud >= 'threshold'. Usa un único embed_content para todos los textos y
+        las consultas KNN en paralelo, o el índice local si está activado.
+        Si falta el índice vectorial de Firestore, recurre al índice local.
+        """
+        if not topic_texts:
             return []
+        try:
+            embeddings = self.embed_texts(list(topic_texts))
+        except Exception as e:
+            logging.warning(f"No se pudieron generar embeddings para la búsqueda vectorial: {e}")
+            return [[] for _ in topic_texts]
+
+        if self.use_local_index:
+            return self.get_local_index().search(embeddings, limit=limit, threshold=threshold)
+
+        @bind_stage
+        def nearest(embedding):
+            return self._nearest_topics(embedding, limit, threshold)
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(embeddings)))) as executor:
+                return list(executor.map(nearest, embeddings))
+        except Exception as e:
+            logging.warning(f"Búsqueda vectorial en Firestore falló (posiblemente falta índice), usando índice local: {e}")
+            try:
+                return self.get_local_index().search(embeddings, limit=limit, threshold=threshold)
+            except Exception as e:
+                logging.error(f"Búsqueda en índice local falló: {e}")
+                return [[] for _ in topic_texts]
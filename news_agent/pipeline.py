@@ -0,0 +1,168 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from news_agent.telemetry import stage as telemetry_stage
+
+_DONE = object()
+
+
+class Stage:
+    """
+    Etapa de un pipeline: aplica 'func' a cada elemento que recibe, con
+    'workers' hilos. 'func' devuelve un iterable con 0..n elementos para la
+    siguiente etapa (o None si no produce nada).
+    Con 'batch_size' > 1, 'func' recibe una lista con el elemento y los que ya
+    esperan en la cola (hasta 'batch_size'), sin esperar a que lleguen más.
+    """
+
+    def __init__(self, name, func, workers=1, batch_size=1):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.batch_size = batch_size
+        self.processed = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.first_start = None
+        self.last_end = None
+        self._lock = threading.Lock()
+
+    @property
+    def wall_time(self):
+        """Tiempo desde que la etapa empezó su primer elemento hasta que terminó el último."""
+        if self.first_start is None:
+            return 0.0
+        return self.last_end - self.first_start
+
+    def _process(self, item):
+        start = time.monotonic()
+        with self._lock:
+            if self.first_start is None:
+                self.first_start = start
+        try:
+            with telemetry_stage(self.name):
+                return list(self.func(item) or [])
+        except Exception as e:
+            logging.error(f"Etapa '{self.name}' falló procesando un elemento: {e}")
+            with self._lock:
+                self.errors += 1
+            return []
+        finally:
+            end = time.monotonic()
+            with self._lock:
+                self.processed += 1
+                self.busy += end - start
+                self.last_end = end
+
+
+class Pipeline:
+    """
+    Ejecuta etapas encadenadas por colas: cada elemento pasa a la siguiente
+    etapa en cuanto está listo, sin esperar al resto del lote, de modo que
+    las etapas se solapan en el tiempo.
+    """
+
+    def __init__(self, stages):
+        self.stages = stages
+
+    def run(self, items):
+        """Procesa 'items' a través de todas las etapas y devuelve las salidas de la última."""
+        queues = [queue.Queue() for _ in range(len(self.stages) + 1)]
+        threads = []
+
+        for index, stage in enumerate(self.stages):
+            inbox, outbox = queues[index], queues[index + 1]
+            next_workers = self.stages[index + 1].workers if index + 1 < len(self.stages) else 1
+            remaining = [stage.workers]
+            remaining_lock = threading.Lock()
+
+            def worker(stage=stage, inbox=inbox, outbox=outbox, next_workers=next_workers,
+                       remaining=remaining, remaining_lock=remaining_lock):
+                done = False
+                while not done:
+                    item = inbox.get()
+                    if item is _DONE:
+                        break
+                    if stage.batch_size > 1:
+                        item = [item]
+                        while len(item) < stage.batch_size:
+                            try:
+                                extra = inbox.get_nowait()
+                            except queue.Empty:
+                                break
+                            if extra is _DONE:
+                                done = True
+                                break
+                            item.append(extra)
+                    for output in stage._process(item):
+                        outbox.put(output)
+                # El último hilo de la etapa avisa a la siguiente de que no habrá más elementos
+                with remaining_lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    for _ in range(next_workers):
+                        outbox.put(_DONE)
+
+            for n in range(stage.workers):
+                thread = threading.Thread(target=worker, name=f"{stage.name}-{n}", daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        for item in items:
+            queues[0].put(item)
+        for _ in range(self.stages[0].workers):
+            queues[0].put(_DONE)
+
+        results = []
+        while True:
+            output = queues[-1].get()
+            if output is _DONE:
+                break
+            results.append(output)
+        for thread in threads:
+            thread.join()
+        return results
+
+    def timings(self):
+        return {stage.name: round(stage.wall_time, 3) for stage in self.stages}
+
+
+@contextmanager
+def timed(timings, name):
+    """
+    Mide el tiempo de un bloque y lo guarda en timings[name]. Las llamadas
+    instrumentadas del bloque se atribuyen a la etapa 'name' (news_agent.telemetry).
+    """
+    start = time.monotonic()
+    try:
+        with telemetry_stage(name):
+            yield
+    finally:
+        timings[name] = round(time.monotonic() - start, 3)
+
+
+def run_concurrently(tasks, timings=None):
+    """
+    Ejecuta ramas independientes a la vez. 'tasks' es un dict {nombre: función sin argumentos}.
+    Devuelve {nombre: resultado}; si se pasa 'timings', guarda el tiempo de cada rama.
+    """
+    timings = timings if timings is not None else {}
+
+    def run(name, func):
+        with timed(timings, name):
+            return func()
+
+    with ThreadPoolExecutor(max_workers=max(1, len(tasks))) as executor:
+        futures = {name: executor.submit(run, name, func) for name, func in tasks.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def log_timings(timings):
+    """Escribe una línea por etapa con su tiempo de reloj."""
+    for name, seconds in timings.items():
+        logging.info(f"Etapa {name}: {seconds:.2f}s")
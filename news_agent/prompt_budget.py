@@ -0,0 +1,124 @@
+import math
+import re
+
+# Aproximación habitual para modelos Gemini con texto en español/inglés
+CHARS_PER_TOKEN = 4
+DEFAULT_TOKEN_BUDGET = 8000
+# Cada artículo recibe al menos este espacio (si tiene texto suficiente)
+MIN_ARTICLE_CHARS = 400
+# Líneas más cortas suelen ser menús, pies de foto o botones
+MIN_PARAGRAPH_CHARS = 60
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+_WORD = re.compile(r"\w{4,}")
+
+
+def estimate_tokens(text):
+    """Estimación rápida del número de tokens de un texto."""
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def _normalize(paragraph):
+    return " ".join(paragraph.casefold().split())
+
+
+def key_paragraphs(text):
+    """Párrafos sustanciales del texto, en orden y sin duplicados."""
+    seen = set()
+    paragraphs = []
+    for line in (text or "").splitlines():
+        line = line.strip()
+        key = _normalize(line)
+        if len(line) >= MIN_PARAGRAPH_CHARS and key not in seen:
+            seen.add(key)
+            paragraphs.append(line)
+    return paragraphs
+
+
+def compress_article(text, max_chars):
+    """
+    Compresión extractiva: conserva los párrafos principales (sin duplicados) en
+    orden hasta 'max_chars'; de los que no caben enteros se toman las frases
+    iniciales que quepan. Si no cabe ni una frase, o el texto no tiene párrafos
+    sustanciales, se recorta tal cual.
+    """
+    paragraphs = key_paragraphs(text)
+    if not paragraphs:
+        return (text or "")[:max_chars]
+
+    kept = []
+    used = 0
+    for paragraph in paragraphs:
+        if used + len(paragraph) <= max_chars:
+            kept.append(paragraph)
+            used += len(paragraph) + 1
+            continue
+        # Frases iniciales del párrafo que aún caben; los párrafos siguientes pueden ser más cortos
+        for sentence in _SENTENCE_END.split(paragraph):
+            if used + len(sentence) > max_chars:
+                break
+            kept.append(sentence)
+            used += len(sentence) + 1
+        if used >= max_chars:
+            break
+    if not kept:
+        # Una primera frase más larga que todo el espacio no debe dejar el artículo vacío
+        return paragraphs[0][:max_chars]
+    return "\n".join(kept)
+
+
+def relevance(article, rank):
+    """
+    Relevancia de un artículo: su 'score' si lo trae (p. ej. de grounding),
+    más un término por posición y otro por cuánto del texto trata del titular.
+    """
+    title_words = set(_WORD.findall((article.get("title") or "").casefold()))
+    lead = (article.get("text") or "")[:3000].casefold()
+    overlap = sum(1 for word in title_words if word in lead) / len(title_words) if title_words else 0.0
+    return float(article.get("score") or 0.0) + 1.0 / (1 + rank) + overlap
+
+
+def allocate(sizes, weights, budget, minimum=MIN_ARTICLE_CHARS):
+    """
+    Reparte 'budget' caracteres proporcionalmente a 'weights', sin dar a nadie más
+    de lo que necesita ('sizes'); lo que sobra se redistribuye entre el resto.
+    """
+    allocation = [min(size, minimum) for size in sizes]
+    remaining = budget - sum(allocation)
+    active = [i for i, size in enumerate(sizes) if size > allocation[i]]
+    while remaining > 0 and active:
+        total_weight = sum(weights[i] for i in active) or len(active)
+        granted = 0
+        for i in active:
+            share = int(remaining * (weights[i] or 1) / total_weight)
+            share = min(share, sizes[i] - allocation[i])
+            allocation[i] += share
+            granted += share
+        remaining -= granted
+        active = [i for i in active if sizes[i] > allocation[i]]
+        if granted == 0:
+            break
+    return allocation
+
+
+def build_articles_section(articles, budget_chars):
+    """
+    Texto de los artículos comprimido para caber en 'budget_chars'.
+    El espacio se reparte entre artículos según su relevancia.
+    """
+    headers = []
+    bodies = []
+    for i, article in enumerate(articles):
+        headers.append(f"--- Articulo {i+1} ---\nTítulo: {article.get('title')}\nFuente: {article.get('url')}\n")
+        bodies.append("\n".join(key_paragraphs(article.get("text"))) or (article.get("text") or ""))
+
+    available = max(0, budget_chars - sum(len(h) + len("Contenido: \n\n") for h in headers))
+    weights = [relevance(article, i) for i, article in enumerate(articles)]
+    # Con muchos artículos el mínimo por artículo no puede superar el presupuesto
+    minimum = min(MIN_ARTICLE_CHARS, available // len(articles)) if articles else 0
+    allocation = allocate([len(body) for body in bodies], weights, available, minimum=minimum)
+
+    parts = []
+    for header, article, chars in zip(headers, articles, allocation):
+        parts.append(f"{header}Contenido: {compress_article(article.get('text'), chars)}\n\n")
+    return "".join(parts)
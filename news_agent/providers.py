@@ -0,0 +1,70 @@
+"""
+Componentes compartidos que se crean la primera vez que se usan.
+
+Los clientes de Firestore y GenAI tardan en importarse y construirse; con estos
+proveedores solo se pagan si la ejecución los necesita, y NewsMemory y
+NewsReasoning comparten un único cliente GenAI.
+"""
+import logging
+import os
+import threading
+
+_lock = threading.RLock()
+_genai_clients = {}
+_instances = {}
+
+
+def get_genai_client(api_key=None):
+    """
+    Cliente GenAI compartido: AI Studio si hay 'api_key', si no Vertex AI
+    (GOOGLE_CLOUD_PROJECT, GOOGLE_CLOUD_LOCATION). Pasa por news_agent.llm_cache.
+    """
+    with _lock:
+        if api_key not in _genai_clients:
+            from news_agent.llm_cache import create_client
+
+            if api_key:
+                _genai_clients[api_key] = create_client(api_key=api_key)
+            else:
+                project_id = os.environ.get("GOOGLE_CLOUD_PROJECT")
+                location = os.environ.get("GOOGLE_CLOUD_LOCATION", "us-central1")
+                _genai_clients[api_key] = create_client(vertexai=True, project=project_id, location=location)
+            logging.info(f"Cliente GenAI creado ({'AI Studio' if api_key else 'Vertex AI'}).")
+        return _genai_clients[api_key]
+
+
+def _singleton(name, factory):
+    with _lock:
+        if name not in _instances:
+            _instances[name] = factory()
+        return _instances[name]
+
+
+def get_firestore_client():
+    def build():
+        from google.cloud import firestore
+        return firestore.Client()
+    return _singleton("firestore", build)
+
+
+def get_memory(api_key=None):
+    """NewsMemory compartido por el proceso."""
+    def build():
+        from news_agent.memory import NewsMemory
+        return NewsMemory(api_key=api_key)
+    return _singleton("memory", build)
+
+
+def get_reasoning(api_key=None):
+    """NewsReasoning compartido por el proceso."""
+    def build():
+        from news_agent.reasoning import NewsReasoning
+        return NewsReasoning(api_key=api_key)
+    return _singleton("reasoning", build)
+
+
+def reset():
+    """Olvida los componentes creados (la siguiente llamada los vuelve a crear)."""
+    with _lock:
+        _genai_clients.clear()
+        _instances.clear()
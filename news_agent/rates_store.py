@@ -0,0 +1,170 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+DEFAULT_DATA_DIR = os.path.join(os.path.expanduser("~"), ".local", "share", "news_agent")
+CURRENCIES = ("USD", "EUR", "MLC")
+SECONDS_PER_DAY = 86400
+
+
+class RateHistory:
+    """
+    Serie histórica de tasas de cambio en almacenamiento columnar de solo anexado.
+
+    Cada columna (timestamp en segundos epoch y una por moneda, NaN si falta)
+    es un fichero binario plano que se lee con np.memmap, así que las consultas
+    por rango no cargan el histórico completo y los cálculos son vectorizados.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(os.environ.get("NEWS_AGENT_DATA_DIR", DEFAULT_DATA_DIR), "rates")
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _column_path(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _column(self, name, dtype):
+        path = self._column_path(name)
+        # Solo los valores completos (una escritura interrumpida puede dejar bytes sueltos)
+        size = os.path.getsize(path) // np.dtype(dtype).itemsize if os.path.exists(path) else 0
+        if not size:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(size,))
+
+    def _columns(self):
+        timestamps = self._column("timestamp", np.int64)
+        values = {currency: self._column(currency, np.float64) for currency in CURRENCIES}
+        # El timestamp se escribe al final de cada fila: su columna marca las filas completas
+        # y lo que las demás tengan de más es de una escritura interrumpida
+        size = min([len(timestamps)] + [len(column) for column in values.values()])
+        return timestamps[:size], {currency: column[:size] for currency, column in values.items()}
+
+    def _truncate(self, rows):
+        """Recorta cada columna a 'rows' filas, descartando los restos de escrituras interrumpidas."""
+        for name, dtype in [("timestamp", np.int64)] + [(currency, np.float64) for currency in CURRENCIES]:
+            path = self._column_path(name)
+            size = rows * np.dtype(dtype).itemsize
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+
+    def __len__(self):
+        return len(self._columns()[0])
+
+    def last_timestamp(self):
+        timestamps, _ = self._columns()
+        return int(timestamps[-1]) if len(timestamps) else None
+
+    def append(self, rates, timestamp=None):
+        """Añade una observación {moneda: tasa}. Los timestamps se mantienen crecientes."""
+        timestamp = int(timestamp if timestamp is not None else time.time())
+        with self._lock:
+            timestamps, _ = self._columns()
+            rows = len(timestamps)
+            if rows and timestamp < timestamps[-1]:
+                timestamp = int(timestamps[-1])
+            del timestamps
+            # Sin esto una fila incompleta desalinearía para siempre las columnas
+            self._truncate(rows)
+            for currency in CURRENCIES:
+                with open(self._column_path(currency), "ab") as f:
+                    f.write(np.float64(rates.get(currency, np.nan)).tobytes())
+            # El timestamp se escribe al final: marca la fila como completa
+            with open(self._column_path("timestamp"), "ab") as f:
+                f.write(np.int64(timestamp).tobytes())
+
+    def range(self, start=None, end=None):
+        """
+        Observaciones con start <= timestamp < end (segundos epoch).
+        Devuelve (timestamps, {moneda: valores}).
+        """
+        timestamps, values = self._columns()
+        lo = 0 if start is None else np.searchsorted(timestamps, start, side="left")
+        hi = len(timestamps) if end is None else np.searchsorted(timestamps, end, side="left")
+        return np.array(timestamps[lo:hi]), {currency: np.array(column[lo:hi]) for currency, column in values.items()}
+
+    def daily(self, days=7, now=None):
+        """
+        Último valor de cada día (UTC) de los últimos 'days' días con datos.
+        Devuelve (inicio_de_cada_día, {moneda: valores}).
+        """
+        now = time.time() if now is None else now
+        start = (int(now) // SECONDS_PER_DAY - days + 1) * SECONDS_PER_DAY
+        timestamps, values = self.range(start=start)
+        if not len(timestamps):
+            return timestamps, values
+        day_index = timestamps // SECONDS_PER_DAY
+        # Índice de la última observación de cada día
+        last = np.flatnonzero(np.append(day_index[1:] != day_index[:-1], True))
+        return day_index[last] * SECONDS_PER_DAY, {currency: column[last] for currency, column in values.items()}
+
+    def trend_table(self, days=7, window=3, now=None):
+        """Tabla compacta con la tasa diaria, su variación diaria y la media móvil."""
+        day_starts, values = self.daily(days=days, now=now)
+        if not len(day_starts):
+            return ""
+        currencies = [c for c in CURRENCIES if not np.all(np.isnan(values[c]))]
+        changes = {c: day_over_day(values[c]) for c in currencies}
+        means = {c: rolling_mean(values[c], window) for c in currencies}
+
+        header = "Fecha | " + " | ".join(f"{c} | Δ{c} | Media{window}d {c}" for c in currencies)
+        lines = [header]
+        for i, day in enumerate(day_starts):
+            date = datetime.fromtimestamp(int(day), tz=timezone.utc).strftime("%Y-%m-%d")
+            cells = []
+            for c in currencies:
+                cells += [_fmt(values[c][i]), _fmt(changes[c][i], signed=True), _fmt(means[c][i])]
+            lines.append(f"{date} | " + " | ".join(cells))
+        return "\n".join(lines)
+
+
+def day_over_day(values):
+    """Variación respecto a la observación anterior (NaN en la primera)."""
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return values
+    return np.concatenate(([np.nan], np.diff(values)))
+
+
+def rolling_mean(values, window):
+    """Media móvil de 'window' observaciones que ignora los NaN."""
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    sums = np.cumsum(np.where(valid, values, 0.0))
+    counts = np.cumsum(valid)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts[window:] = counts[window:] - counts[:-window]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def _fmt(value, signed=False):
+    if np.isnan(value):
+        return "-"
+    return f"{value:+g}" if signed else f"{value:g}"
+
+
+def record_rates(record, history=None):
+    """
+    Guarda las tasas de un registro de news_agent.indicators y devuelve la tabla de tendencia.
+    Devuelve "" si el registro no tiene tasas o no se puede escribir el histórico.
+    """
+    if not record or not record.get("rates"):
+        return ""
+    try:
+        if history is None:
+            history = RateHistory()
+        timestamp = int(record["fetched_at"].timestamp())
+        # El mismo registro (cacheado) puede llegar varias veces en una ejecución
+        if history.last_timestamp() != timestamp:
+            history.append(record["rates"], timestamp=timestamp)
+        return history.trend_table()
+    except OSError as e:
+        logging.warning(f"No se pudo actualizar el histórico de tasas: {e}")
+        return ""
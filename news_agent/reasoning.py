@@ -1,33 +1,50 @@
+import asyncio
+import datetime
 import logging
 import os
-from google import genai
+from concurrent.futures import ThreadPoolExecutor
 from google.genai import types
-import json
+from google.genai.types import GoogleSearch, Tool
+from pydantic import BaseModel
+from news_agent.digest import format_topic_digest
+from news_agent.providers import get_genai_client
+from news_agent.telemetry import bind_stage
+from news_agent.dedup import canonical_url
+from news_agent.grounding import parse_grounding, parse_text_urls, resolve_redirects
+from news_agent.json_stream import JsonStringFieldStream
+from news_agent.schemas import NewsletterSummary, RedundancyVerdicts, SearchQueries
+from news_agent.indicators import format_rates
+from news_agent.prompt_budget import CHARS_PER_TOKEN, DEFAULT_TOKEN_BUDGET, build_articles_section, estimate_tokens
+
+# Búsquedas con grounding simultáneas como máximo
+GROUNDING_CONCURRENCY = 4
 
 class NewsReasoning:
-    def __init__(self, model_name="gemini-1.5-flash", api_key=None):
+    def __init__(self, model_name="gemini-1.5-flash", api_key=None, client=None):
         project_id = os.environ.get("GOOGLE_CLOUD_PROJECT")
-        location = os.environ.get("GOOGLE_CLOUD_LOCATION", "us-central1")
         api_key = os.environ.get("GOOGLE_API_KEY")
         
-        if api_key:
+        if client is not None:
+            # Cliente ya construido (p. ej. el falso de benchmarks/fakes.py)
+            self.client = client
+            self.model_name = model_name
+        elif api_key:
             # Use Google AI Studio
-            self.client = genai.Client(api_key=api_key)
+            self.client = get_genai_client(api_key)
             self.model_name = os.environ.get("GOOGLE_MODEL_NAME", "gemini-2.5-pro") # Default to Gemini 2.5 Pro
             logging.info(f"Google Gen AI SDK inicializado con AI Studio. Modelo: {self.model_name}")
         else:
             # Use Vertex AI
             if not project_id:
                 logging.warning("GOOGLE_CLOUD_PROJECT no está configurada.")
-            self.client = genai.Client(vertexai=True, project=project_id, location=location)
+            self.client = get_genai_client()
             self.model_name = model_name
             logging.info(f"Google Gen AI SDK inicializado con Vertex AI. Modelo: {self.model_name}")
 
     def generate_search_queries(self, past_summaries):
         """Genera 3 términos de búsqueda basados en el contexto pasado."""
-        import datetime
         current_date = datetime.datetime.now().strftime("%Y-%m-%d")
-        context_text = "\n".join([f"- {s['timestamp']}: {', '.join(s['topics_covered'])}" for s in past_summaries])
+        context_text = format_topic_digest(past_summaries)
         
         prompt = f"""
         Eres un agente de noticias experto en Cuba. Hoy es {current_date}.
@@ -40,154 +57,235 @@ class NewsReasoning:
         - No limites las búsquedas a un solo dominio usando 'site:'. Usa términos generales para obtener resultados de diversas fuentes.
         - Evita temas que ya estén cerrados o repetidos sin nueva información.
         
-        Responde únicamente con un objeto JSON que contenga una lista de strings llamada 'queries'.
+        Devuelve la lista de términos en el campo 'queries'.
         Ejemplo: {{"queries": ["apagones cuba hoy", "relaciones cuba estados unidos", "economía cuba 2025"]}}
         """
         
         try:
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt
-            )
-            # Basic JSON extraction from response text
-            text = response.text.strip()
-            if "```json" in text:
-                text = text.split("```json")[1].split("```")[0].strip()
-            elif "```" in text:
-                text = text.split("```")[1].split("```")[0].strip()
-            
-            data = json.loads(text)
-            queries = data.get("queries", ["actualidad Cuba hoy", "noticias Cuba última hora", "Cuba 2025"])
+            data = self._generate_json(prompt, SearchQueries)
+            queries = data["queries"] or ["actualidad Cuba hoy", "noticias Cuba última hora", "Cuba 2025"]
             logging.info(f"Queries generadas: {queries}")
             return queries[:3]
         except Exception as e:
             logging.error(f"Error al generar queries: {e}")
             return ["actualidad Cuba hoy", "noticias Cuba última hora", "Cuba 2025"]
 
-    def grounded_search(self, queries):
+    def grounded_search(self, queries, max_concurrency=GROUNDING_CONCURRENCY, timeout=60):
         """Realiza búsquedas usando Vertex AI Grounding con Google Search."""
+        return _run_sync(self.grounded_search_async(queries, max_concurrency=max_concurrency, timeout=timeout))
+
+    async def grounded_search_async(self, queries, max_concurrency=GROUNDING_CONCURRENCY, timeout=60):
+        """
+        Lanza todas las búsquedas con grounding a la vez, con un máximo de
+        'max_concurrency' llamadas simultáneas y un timeout por query.
+        Los resultados se combinan en el orden de las queries, sin importar cuál termine primero.
+        """
+        if not queries:
+            return []
+
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(max_concurrency)
+        # Executor propio: las llamadas que superen el timeout no bloquean la salida.
+        # Un hilo por query (el semáforo limita la concurrencia): una llamada que superó
+        # el timeout sigue ocupando su hilo y no debe retrasar a las siguientes.
+        executor = ThreadPoolExecutor(max_workers=len(queries), thread_name_prefix="grounding")
+
+        # Los hilos del executor no heredan la etapa de telemetría
+        grounded_query = bind_stage(self._grounded_query)
+
+        async def run_query(query):
+            async with semaphore:
+                try:
+                    response = await asyncio.wait_for(
+                        loop.run_in_executor(executor, grounded_query, query),
+                        timeout=timeout
+                    )
+                except asyncio.TimeoutError:
+                    logging.warning(f"Grounding para '{query}' superó el timeout de {timeout}s.")
+                    return []
+                except Exception as e:
+                    logging.warning(f"Grounding falló para '{query}': {e}")
+                    # Fallback to standard search is handled in main.py if this returns empty
+                    return []
+            results = self._parse_grounding_response(query, response)
+            logging.info(f"Grounding para '{query}' encontró {len(results)} URLs.")
+            return results
+
+        try:
+            per_query_results = await asyncio.gather(*(run_query(query) for query in queries))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        # Las URLs de redirección de todas las queries se resuelven a la vez, antes de deduplicar
+        await asyncio.to_thread(bind_stage(resolve_redirects), [r for results in per_query_results for r in results])
+
         all_results = []
-        for query in queries:
-            try:
-                # Grounding with Google Search
-                # Note: This requires the model to support grounding, e.g., gemini-1.5-pro or gemini-1.5-flash
-                # and the client must be initialized with Vertex AI or have access to Google Search tool.
-                
-                # For AI Studio, grounding is not directly available via the same API yet, 
-                # but we can simulate it or use the model's knowledge if it's fresh.
-                # However, the user wants Vertex AI Grounding.
-                
-                # If using AI Studio, we might need a different approach or just rely on its fresh knowledge.
-                # Given the constraints, I will implement it using the Google Search tool if available, 
-                # or fallback to standard generation if not.
-                
-                from google.genai.types import Tool, GoogleSearch
-                
-                google_search_tool = Tool(google_search=GoogleSearch())
-                
-                response = self.client.models.generate_content(
-                    model=self.model_name,
-                    contents=f"Busca noticias recientes sobre: {query}. Proporciona una lista de URLs de fuentes confiables.",
-                    config={
-                        'tools': [google_search_tool],
-                    }
-                )
-                
-                # Extract URLs from grounding metadata or text
-                # This is a bit tricky as the structure depends on the response.
-                # We will look for URLs in the text as a fallback.
-                import re
-                urls = re.findall(r'https?://[^\s<>"]+|www\.[^\s<>"]+', response.text)
-                
-                for url in urls:
-                    # Clean URL
-                    url = url.strip().rstrip(').,')
-                    if url not in [r['url'] for r in all_results]:
-                        all_results.append({
-                            'title': f"Resultado de Grounding para {query}",
-                            'url': url,
-                            'snippet': response.text[:200] # Use part of response as snippet
-                        })
-                
-                logging.info(f"Grounding para '{query}' encontró {len(urls)} URLs.")
-                
-            except Exception as e:
-                logging.warning(f"Grounding falló para '{query}': {e}")
-                # Fallback to standard search is handled in main.py if this returns empty
-        
+        seen_urls = set()
+        for results in per_query_results:
+            for result in results:
+                url = canonical_url(result['url'])
+                if url not in seen_urls:
+                    seen_urls.add(url)
+                    all_results.append(result)
         return all_results
 
+    def _grounded_query(self, query):
+        """Llamada bloqueante a generate_content con la herramienta de Google Search."""
+        # Grounding with Google Search
+        # Note: This requires the model to support grounding, e.g., gemini-1.5-pro or gemini-1.5-flash
+        # and the client must be initialized with Vertex AI or have access to Google Search tool.
+        google_search_tool = Tool(google_search=GoogleSearch())
+        
+        return self.client.models.generate_content(
+            model=self.model_name,
+            contents=f"Busca noticias recientes sobre: {query}. Proporciona una lista de URLs de fuentes confiables.",
+            config={
+                'tools': [google_search_tool],
+            }
+        )
+
+    def _parse_grounding_response(self, query, response):
+        """
+        Resultados (título, URL, dominio, snippet, puntuación) de una respuesta con
+        grounding, a partir de grounding_metadata (news_agent.grounding). Si no trae
+        metadatos, se buscan las URLs en el texto de la respuesta.
+        """
+        results = parse_grounding(response, query)
+        if not results:
+            results = parse_text_urls(response.text, query)
+        return results
+
     def filter_articles(self, articles, memory):
-        """Filtra artículos que sean semánticamente redundantes usando memoria vectorial."""
+        """
+        Filtra artículos que sean semánticamente redundantes usando memoria vectorial.
+        Los títulos se embeben en una sola petición, las búsquedas KNN van en paralelo
+        y todos los artículos dudosos se evalúan en un único prompt.
+        """
         if not articles:
             return []
         
-        filtered_articles = []
-        for article in articles:
-            title = article.get('title', '')
-            snippet = article.get('snippet', '')
-            
-            # 1. Buscar temas similares en memoria vectorial
-            similar_topics = memory.find_similar_topics(title, limit=3)
-            
+        # 1. Buscar temas similares en memoria vectorial para todos los artículos a la vez
+        titles = [article.get('title', '') for article in articles]
+        similar_per_article = memory.find_similar_topics_batch(titles, limit=3)
+        
+        ambiguous = []
+        for i, (article, similar_topics) in enumerate(zip(articles, similar_per_article)):
             if similar_topics:
-                logging.info(f"Temas similares encontrados para '{title}': {similar_topics}")
-                # 2. Usar LLM para decidir si es redundante basado en temas similares
-                prompt = f"""
-                Analiza si la siguiente noticia es redundante con respecto a los temas ya cubiertos recientemente.
-                
-                Temas cubiertos recientemente (similares): {', '.join(similar_topics)}
-                
-                Nueva noticia:
-                Título: {title}
-                Resumen: {snippet}
-                
-                ¿Es esta noticia nueva y aporta información relevante, o es repetida/redundante con los temas cubiertos?
-                Responde únicamente con 'NUEVA' o 'REPETIDA'.
-                """
-                
-                try:
-                    response = self.client.models.generate_content(
-                        model=self.model_name,
-                        contents=prompt
-                    )
-                    result = response.text.strip().upper()
-                    if "NUEVA" in result:
-                        filtered_articles.append(article)
-                    else:
-                        logging.info(f"Artículo filtrado por redundancia semántica: {title}")
-                except Exception as e:
-                    logging.error(f"Error al filtrar artículo: {e}")
-                    filtered_articles.append(article) # Keep it if error
-            else:
-                # No hay temas similares, es nueva
+                logging.info(f"Temas similares encontrados para '{titles[i]}': {similar_topics}")
+                ambiguous.append((i, article, similar_topics))
+        
+        # 2. Usar LLM para decidir qué artículos dudosos son redundantes
+        verdicts = self._redundancy_verdicts(ambiguous) if ambiguous else {}
+        
+        filtered_articles = []
+        for i, article in enumerate(articles):
+            # Sin temas similares (o sin veredicto) se considera nueva
+            if verdicts.get(i, True):
                 filtered_articles.append(article)
+            else:
+                logging.info(f"Artículo filtrado por redundancia semántica: {titles[i]}")
         
         return filtered_articles
 
-    def summarize_articles(self, articles_data=None, past_summaries=None, economic_data=None):
-        """Genera un resumen consolidado de los artículos en formato HTML."""
-        articles_text = ""
-        if articles_data:
-            for i, art in enumerate(articles_data):
-                articles_text += f"--- Articulo {i+1} ---\n"
-                articles_text += f"Título: {art.get('title')}\n"
-                articles_text += f"Fuente: {art.get('url')}\n"
-                articles_text += f"Contenido: {art.get('text')[:2000]}\n\n" # Limit text per article
-        else:
-            articles_text = "No se encontraron nuevas noticias relevantes hoy."
+    def _redundancy_verdicts(self, ambiguous):
+        """
+        Evalúa en un solo prompt si cada artículo dudoso es nuevo.
+        'ambiguous' es una lista de (índice, artículo, temas_similares).
+        Devuelve {índice: True si es NUEVA, False si es REPETIDA}.
+        """
+        items_text = ""
+        for n, (_, article, similar_topics) in enumerate(ambiguous, 1):
+            items_text += f"--- Noticia {n} ---\n"
+            items_text += f"Temas cubiertos recientemente (similares): {', '.join(similar_topics)}\n"
+            items_text += f"Título: {article.get('title', '')}\n"
+            items_text += f"Resumen: {article.get('snippet', '')}\n\n"
+        
+        prompt = f"""
+        Analiza si cada una de las siguientes noticias es redundante con respecto a los temas ya cubiertos recientemente.
+        
+        {items_text}
+        
+        Para cada noticia, ¿es nueva y aporta información relevante, o es repetida/redundante con los temas cubiertos?
+        Da un veredicto 'NUEVA' o 'REPETIDA' por noticia, identificada por su número en 'id'.
+        Ejemplo: {{"verdicts": [{{"id": 1, "verdict": "NUEVA"}}, {{"id": 2, "verdict": "REPETIDA"}}]}}
+        """
+        
+        try:
+            data = self._generate_json(prompt, RedundancyVerdicts)
+        except Exception as e:
+            logging.error(f"Error al filtrar artículos: {e}")
+            return {} # Keep them all if error
         
-        context_text = ""
-        if past_summaries:
-            context_text = "\n".join([f"- {s['timestamp']}: {', '.join(s['topics_covered'])}" for s in past_summaries])
+        verdicts = {}
+        for item in data["verdicts"]:
+            n = item["id"]
+            if 1 <= n <= len(ambiguous):
+                verdicts[ambiguous[n - 1][0]] = item["verdict"] == "NUEVA"
+        return verdicts
+
+    def _generate_json(self, contents, schema):
+        """
+        Llama al modelo en modo JSON con el esquema 'schema' (news_agent.schemas)
+        y devuelve la respuesta validada como dict.
+        """
+        response = self.client.models.generate_content(
+            model=self.model_name,
+            contents=contents,
+            config=_json_config(schema)
+        )
+        return _parse_structured(response, schema)
+
+    def _stream_summary(self, contents, on_html_chunk):
+        """
+        Genera el resumen en streaming: cada fragmento de 'summary_html' se pasa a
+        'on_html_chunk' en cuanto llega, sin esperar a la respuesta completa.
+        Devuelve la respuesta completa validada como dict.
+        """
+        html_stream = JsonStringFieldStream("summary_html")
+        parts = []
+        for chunk in self.client.models.generate_content_stream(
+            model=self.model_name,
+            contents=contents,
+            config=_json_config(NewsletterSummary)
+        ):
+            text = chunk.text or ""
+            parts.append(text)
+            html = html_stream.feed(text)
+            if html:
+                on_html_chunk(html)
+        return _validate_json("".join(parts), NewsletterSummary)
+
+    def summarize_articles(self, articles_data=None, past_summaries=None, economic_data=None, rate_trends=None, token_budget=None, on_html_chunk=None, instructions=None):
+        """
+        Genera un resumen consolidado de los artículos en formato HTML.
+        'rate_trends' es la tabla de evolución de las tasas (news_agent.rates_store).
+        'instructions' son indicaciones propias de una edición (news_agent.editions),
+        con prioridad sobre las generales.
+        El prompt se ajusta a 'token_budget' (SUMMARY_TOKEN_BUDGET) comprimiendo los
+        artículos de forma extractiva según su relevancia.
+        Si se pasa 'on_html_chunk', la respuesta se pide en streaming y el HTML se
+        le entrega por fragmentos a medida que llega.
+        """
+        if token_budget is None:
+            token_budget = int(os.environ.get("SUMMARY_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+        
+        context_text = format_topic_digest(past_summaries) if past_summaries else ""
 
         economic_section = ""
         contents = []
         
-        if economic_data:
+        if isinstance(economic_data, dict):
+            # Registro estructurado de news_agent.indicators
+            if economic_data.get("rates"):
+                economic_section = f"\n{format_rates(economic_data)}\n"
+                if rate_trends:
+                    economic_section += f"Evolución de las tasas (últimos días):\n{rate_trends}\n"
+            else:
+                economic_data = economic_data.get("image")
+        
+        if economic_data and not economic_section:
             if isinstance(economic_data, bytes):
                 # Handle image data
-                from google.genai import types
                 img_part = types.Part.from_bytes(data=economic_data, mime_type="image/png")
                 contents.append(img_part)
                 economic_section = "\n[Imagen de Tasas de Cambio adjunta]\n"
@@ -195,11 +293,18 @@ class NewsReasoning:
                 # Handle text data
                 economic_section = f"\nDatos de Tasas de Cambio (El Toque):\n{economic_data[:2000]}\n"
 
-        prompt = f"""
+        edition_section = ""
+        if instructions:
+            edition_section = f"\nInstrucciones de esta edición (tienen prioridad sobre las anteriores):\n{instructions.strip()}\n"
+
+        # El prompt se compone en una sola pasada: los datos interpolados (tasas, resúmenes,
+        # instrucciones) pueden contener llaves y no deben volver a pasar por str.format
+        def render(articles_text):
+            return f"""
         Eres un periodista internacional experto en política y economía de Cuba.
         Crea un boletín de noticias profesional en formato HTML.
         
-        Contexto de días anteriores:
+        Resúmenes Recientes (Contexto de días anteriores):
         {context_text}
         
         Noticias de hoy:
@@ -220,39 +325,75 @@ class NewsReasoning:
         Contenido:
         - Si hay noticias nuevas: Analiza los hechos del día, comparando con días anteriores. Contrasta fuentes oficiales e internacionales.
         - Si NO hay noticias nuevas: Indica que la situación se mantiene estable.
-        3. **Sección de Economía (OBLIGATORIA)**: Incluye siempre una sección con las tasas de cambio, usando los datos proporcionados. Si no hay datos, indica que no están disponibles hoy, pero mantén la sección.
+        - **Sección de Economía (OBLIGATORIA)**: Incluye siempre una sección con las tasas de cambio, usando los datos proporcionados. Si no hay datos, indica que no están disponibles hoy, pero mantén la sección.
         
         Usa un tono profesional, analítico y objetivo.
-        
-        Datos de Noticias:
-        {articles_text}
-        
-        {economic_section}
-        
-        Resúmenes Recientes (Contexto):
-        {context_text}
-        
-        Responde únicamente con un objeto JSON:
-        {{
-            "summary_html": "contenido HTML aquí...",
-            "topics": ["tema1", "tema2", "tema3"]
-        }}
+        {edition_section}
+        Devuelve el boletín en 'summary_html' y los temas tratados en 'topics'.
         """
-        contents.append(prompt)
-        
+
         try:
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=contents
-            )
-            text = response.text.strip()
-            if "```json" in text:
-                text = text.split("```json")[1].split("```")[0].strip()
-            elif "```" in text:
-                text = text.split("```")[1].split("```")[0].strip()
-            
-            data = json.loads(text)
-            return data.get("summary_html", ""), data.get("topics", [])
+            if articles_data:
+                # Espacio para los artículos: lo que queda del presupuesto tras el resto del prompt
+                budget_chars = token_budget * CHARS_PER_TOKEN - len(render(""))
+                articles_text = build_articles_section(articles_data, budget_chars)
+            else:
+                articles_text = "No se encontraron nuevas noticias relevantes hoy."
+            prompt = render(articles_text)
+            contents.append(prompt)
+
+            # Comparación con el prompt anterior (secciones duplicadas y 2000 caracteres fijos por artículo)
+            if articles_data:
+                legacy_article_tokens = sum(estimate_tokens((art.get('text') or '')[:2000]) for art in articles_data)
+                legacy_tokens = estimate_tokens(prompt) - estimate_tokens(articles_text) + 2 * legacy_article_tokens \
+                    + estimate_tokens(context_text) + estimate_tokens(economic_section)
+                prompt_tokens = estimate_tokens(prompt)
+                logging.info(f"Prompt de resumen: ~{prompt_tokens} tokens (presupuesto {token_budget}), "
+                             f"~{max(0, legacy_tokens - prompt_tokens)} tokens ahorrados.")
+
+            if on_html_chunk:
+                data = self._stream_summary(contents, on_html_chunk)
+            else:
+                data = self._generate_json(contents, NewsletterSummary)
+            return data["summary_html"], data["topics"]
         except Exception as e:
             logging.error(f"Error al resumir: {e}")
             return "Error al generar el resumen.", []
+
+
+def _run_sync(coro):
+    """Ejecuta una corrutina desde código síncrono, aunque ya haya un event loop activo (p. ej. herramientas ADK)."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+def _json_config(schema):
+    return types.GenerateContentConfig(response_mime_type="application/json", response_schema=schema)
+
+
+def _parse_structured(response, schema):
+    """
+    Respuesta de una llamada en modo JSON como dict. Usa el objeto ya validado
+    por el SDK y, si no lo hay, valida el texto contra 'schema'.
+    """
+    if isinstance(response.parsed, BaseModel):
+        return response.parsed.model_dump()
+    return _validate_json(response.text, schema)
+
+
+def _validate_json(text, schema):
+    return schema.model_validate_json(_extract_json(text or "")).model_dump()
+
+
+def _extract_json(text):
+    """Extrae el bloque JSON de una respuesta de texto, quitando los delimitadores ``` si los hay."""
+    text = text.strip()
+    if "```json" in text:
+        text = text.split("```json")[1].split("```")[0].strip()
+    elif "```" in text:
+        text = text.split("```")[1].split("```")[0].strip()
+    return text
@@ -0,0 +1,23 @@
+"""Esquemas de respuesta para las llamadas a Gemini con salida JSON estructurada."""
+from typing import List, Literal
+
+from pydantic import BaseModel
+
+
+class SearchQueries(BaseModel):
+    queries: List[str]
+
+
+class RedundancyVerdict(BaseModel):
+    id: int
+    verdict: Literal["NUEVA", "REPETIDA"]
+
+
+class RedundancyVerdicts(BaseModel):
+    verdicts: List[RedundancyVerdict]
+
+
+class NewsletterSummary(BaseModel):
+    # summary_html va primero para poder consumirlo en streaming antes de que llegue 'topics'
+    summary_html: str
+    topics: List[str]
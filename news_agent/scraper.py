@@ -1,41 +1,146 @@
-import requests
-from bs4 import BeautifulSoup
+import codecs
 import logging
+import os
+import re
+import requests
+from news_agent.http_cache import get_default_cache
+from news_agent.extractors import StreamingTextExtractor, default_backend, extract_text
+from news_agent.telemetry import count, span
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+# Content types worth parsing; anything else (PDF, images, video...) is skipped before download
+HTML_CONTENT_TYPES = {"text/html", "application/xhtml+xml", "text/plain"}
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+# <meta charset="..."> or <meta http-equiv="Content-Type" content="text/html; charset=...">
+META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
 
-def extract_content(url):
+def extract_content(url, session=None, timeout=10, cache=None, use_cache=True, backend=None, main_content=False, max_bytes=None):
     """
     Fetches the URL and extracts the main text content.
-    Returns a dictionary with 'text' and 'url'.
+    Returns the extracted text, or an empty string on failure.
+    If a requests.Session is given, its pooled keep-alive connections are reused.
+    Pages are cached on disk (see news_agent.http_cache), per URL and extraction
+    variant (backend, main_content): a fresh hit skips the download and the
+    parsing, a stale one is revalidated with ETag/Last-Modified.
+    The body is streamed: non-HTML content types are rejected before it is
+    downloaded and reading stops after 'max_bytes' (SCRAPER_MAX_BYTES, 2 MB).
+    See html_to_text for the extraction backend and main-content options.
     """
+    if cache is None and use_cache:
+        cache = get_default_cache()
+    if max_bytes is None:
+        max_bytes = int(os.environ.get("SCRAPER_MAX_BYTES", DEFAULT_MAX_BYTES))
+    backend = backend or default_backend()
+    key = cache_key(url, backend, main_content)
+    
+    cached = cache.get(key) if cache else None
+    if cached and cache.is_fresh(cached):
+        cache.record("hit")
+        count("http_cache", result="hit")
+        logging.info(f"Cache hit: {url}")
+        return cached.text
+    
     logging.info(f"Scraping: {url}")
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
+    http = session or requests
+    headers = dict(HEADERS)
+    if cached:
+        headers.update(cache.conditional_headers(cached))
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Remove script and style elements
-        for script in soup(["script", "style", "nav", "footer", "header"]):
-            script.decompose()
+        with span("http.get"), http.get(url, headers=headers, timeout=timeout, stream=True) as response:
+            if cached and response.status_code == 304:
+                cache.touch(key)
+                cache.record("revalidated")
+                count("http_cache", result="revalidated")
+                logging.info(f"Not modified, using cached content: {url}")
+                return cached.text
             
-        # Get text
-        text = soup.get_text(separator='\n')
+            response.raise_for_status()
+            
+            content_type = response.headers.get("Content-Type", "")
+            mime_type = content_type.split(";")[0].strip().lower()
+            if mime_type and mime_type not in HTML_CONTENT_TYPES:
+                logging.warning(f"Skipping {url}: unsupported content type '{mime_type}'")
+                return ""
+            
+            text = read_text(response, max_bytes, backend=backend, main_content=main_content)
         
-        # Break into lines and remove leading and trailing space on each
-        lines = (line.strip() for line in text.splitlines())
-        # Break multi-headlines into a line each
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        # Drop blank lines
-        text = '\n'.join(chunk for chunk in chunks if chunk)
+        if cache:
+            cache.record("miss")
+            count("http_cache", result="miss")
+        if cache and text and "no-store" not in response.headers.get("Cache-Control", ""):
+            cache.store(key, text, response.headers.get("ETag"), response.headers.get("Last-Modified"))
         
         return text
     except Exception as e:
         logging.error(f"Failed to scrape {url}: {e}")
         return ""
 
+def cache_key(url, backend, main_content=False):
+    """Cache key of the text extracted from 'url' with a backend (the URL stays a prefix, for TTL rules)."""
+    return f"{url} {backend}{' main' if main_content else ''}"
+
+def read_text(response, max_bytes, backend=None, main_content=False, chunk_size=CHUNK_SIZE):
+    """
+    Reads a streamed response up to 'max_bytes' and extracts its text.
+    With the streaming backend each chunk is fed to the extractor as it
+    arrives; otherwise the (bounded) body is parsed once it has been read.
+    """
+    backend = backend or default_backend()
+    decoder = None
+    extractor = StreamingTextExtractor() if backend == "stream" and not main_content else None
+    pieces = []
+    
+    received = 0
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        if received + len(chunk) > max_bytes:
+            chunk = chunk[:max_bytes - received]
+            logging.warning(f"Response from {response.url} exceeds {max_bytes} bytes, truncating.")
+        received += len(chunk)
+        if decoder is None:
+            decoder = codecs.getincrementaldecoder(response_encoding(response, chunk))(errors="replace")
+        piece = decoder.decode(chunk)
+        if extractor:
+            extractor.feed(piece)
+        else:
+            pieces.append(piece)
+        if received >= max_bytes:
+            break
+    
+    tail = decoder.decode(b"", final=True) if decoder else ""
+    if extractor:
+        extractor.feed(tail)
+        return extractor.finish()
+    pieces.append(tail)
+    return html_to_text("".join(pieces), backend=backend, main_content=main_content)
+
+def response_encoding(response, head):
+    """
+    Encoding of a response body. requests reports ISO-8859-1 for any text/*
+    response without a charset header, so in that case the document's
+    <meta charset> (found in 'head', its first bytes) is used, or else UTF-8.
+    """
+    encoding = None
+    if "charset" in response.headers.get("Content-Type", "").lower():
+        encoding = response.encoding
+    else:
+        match = META_CHARSET.search(head)
+        if match:
+            encoding = match.group(1).decode("ascii", "replace")
+    try:
+        return codecs.lookup(encoding).name if encoding else "utf-8"
+    except LookupError:
+        return "utf-8"
+
+def html_to_text(html, backend=None, main_content=False):
+    """
+    Extracts the visible text of an HTML document, one phrase per line.
+    The backend (bs4, lxml or stream) defaults to the SCRAPER_BACKEND env variable.
+    """
+    return extract_text(html, backend=backend, main_content=main_content)
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
     # Test with a dummy URL if needed, or just run main
@@ -0,0 +1,253 @@
+"""
+Conjunto persistente de noticias ya vistas, para el modo incremental (INCREMENTAL=true).
+
+Cada noticia deja huellas de 64 bits (SHA-256 truncado) de su URL, de su título
+y de su texto extraído. Con 64 bits las colisiones son despreciables para
+decenas de miles de noticias, y un mes de huellas ocupa unos cientos de KB.
+
+Backends (SEEN_STORE):
+- "local" (por defecto): fichero de solo anexado NEWS_AGENT_DATA_DIR/seen.bin con
+  registros (huella uint64, día uint32).
+- "firestore": un documento por día en la colección news_agent_seen (y uno por
+  noticia pendiente en news_agent_seen_pending).
+Las huellas de más de SEEN_RETENTION_DAYS días (30) se olvidan.
+
+Las noticias de una ejecución sin suficientes novedades (INCREMENTAL_MIN_ARTICLES)
+quedan pendientes con su texto (hold()): la siguiente ejecución las reutiliza sin
+volver a extraerlas, hasta que se envían (add()) o pasan PENDING_MAX_HOURS horas.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from news_agent.dedup import canonical_url
+from news_agent.embedding_cache import normalize_text
+from news_agent.rates_store import DEFAULT_DATA_DIR, SECONDS_PER_DAY
+from news_agent.telemetry import span
+
+DEFAULT_RETENTION_DAYS = 30
+# Títulos más cortos ("Última hora", "Cuba") no identifican una noticia
+MIN_TITLE_CHARS = 20
+RECORD = np.dtype([("fingerprint", "<u8"), ("day", "<u4")])
+# Pasado este tiempo una noticia pendiente ya no es novedad: se marca como vista
+PENDING_MAX_HOURS = 24
+# Texto máximo de una noticia pendiente en Firestore (documentos de 1 MiB como máximo)
+MAX_PENDING_TEXT_CHARS = 200_000
+
+
+def fingerprint(kind, value):
+    """Huella de 64 bits de 'value' en el espacio 'kind' (url, title, text)."""
+    digest = hashlib.sha256(f"{kind}\0{value}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little")
+
+
+def article_fingerprints(article):
+    """
+    Huellas de un artículo: URL, título (si es lo bastante largo y viene de la
+    fuente, no de la URL ni de un marcador) y texto (si se extrajo).
+    """
+    fingerprints = []
+    if article.get("url"):
+        fingerprints.append(fingerprint("url", canonical_url(article["url"])))
+    title = normalize_text(article.get("title") or "").lower()
+    if len(title) >= MIN_TITLE_CHARS and not article.get("derived_title"):
+        fingerprints.append(fingerprint("title", title))
+    text = normalize_text(article.get("text") or "")
+    if text:
+        fingerprints.append(fingerprint("text", text))
+    return fingerprints
+
+
+def fingerprints_of(articles):
+    """Huellas de todos los artículos (para guardarlas, p. ej. en el outbox de news_agent.delivery)."""
+    return [fp for article in articles for fp in article_fingerprints(article)]
+
+
+def _today():
+    return int(time.time() // SECONDS_PER_DAY)
+
+
+class SeenStore:
+    """Conjunto de huellas en memoria; las subclases lo cargan y lo persisten."""
+
+    def __init__(self, retention_days=None):
+        if retention_days is None:
+            retention_days = int(os.environ.get("SEEN_RETENTION_DAYS", DEFAULT_RETENTION_DAYS))
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._fingerprints = set(self._load(_today() - retention_days))
+        self._pending = self._load_pending()
+        logging.info(f"Noticias vistas: {len(self._fingerprints)} huellas de los últimos {retention_days} días.")
+        expired = [article for article in self._pending
+                   if time.time() - article.get("held_at", 0) > PENDING_MAX_HOURS * 3600]
+        if expired:
+            self.add(expired)
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+    def is_seen(self, article):
+        """True si la URL, el título o el texto del artículo ya se vieron."""
+        return any(fp in self._fingerprints for fp in article_fingerprints(article))
+
+    def add(self, articles):
+        """
+        Marca los artículos como vistos (y deja de tenerlos pendientes).
+        Devuelve cuántas huellas nuevas se guardaron.
+        """
+        return self.add_fingerprints(fingerprints_of(articles))
+
+    def add_fingerprints(self, fingerprints):
+        """Como add(), con las huellas ya calculadas (fingerprints_of)."""
+        with self._lock:
+            new = []
+            for fp in fingerprints:
+                if fp not in self._fingerprints:
+                    self._fingerprints.add(fp)
+                    new.append(fp)
+            if new:
+                self._persist(new, _today())
+            pending = [article for article in self._pending if not self.is_seen(article)]
+            if len(pending) < len(self._pending):
+                self._pending = pending
+                self._persist_pending(pending)
+        return len(new)
+
+    def pending(self):
+        """Noticias pendientes de ejecuciones anteriores, ya filtradas y con su texto."""
+        with self._lock:
+            return [dict(article) for article in self._pending]
+
+    def hold(self, articles):
+        """Deja los artículos (los de esta ejecución, que incluyen los pendientes) para la siguiente."""
+        now = time.time()
+        with self._lock:
+            held = {canonical_url(article.get("url")): article.get("held_at") for article in self._pending}
+            self._pending = [dict(article, held_at=held.get(canonical_url(article.get("url"))) or now)
+                             for article in articles]
+            self._persist_pending(self._pending)
+        logging.info(f"{len(articles)} noticias pendientes para la próxima ejecución.")
+
+    def _load(self, since_day):
+        return []
+
+    def _persist(self, fingerprints, day):
+        pass
+
+    def _load_pending(self):
+        return []
+
+    def _persist_pending(self, articles):
+        pass
+
+
+class LocalSeenStore(SeenStore):
+    """Huellas en un fichero binario local de solo anexado, compactado al cargar."""
+
+    def __init__(self, path=None, retention_days=None):
+        if path is None:
+            path = os.path.join(os.environ.get("NEWS_AGENT_DATA_DIR", DEFAULT_DATA_DIR), "seen.bin")
+        self.path = path
+        self.pending_path = f"{os.path.splitext(path)[0]}_pending.json"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        super().__init__(retention_days)
+
+    def _load(self, since_day):
+        if not os.path.exists(self.path):
+            return []
+        records = np.fromfile(self.path, dtype=RECORD, count=os.path.getsize(self.path) // RECORD.itemsize)
+        recent = records[records["day"] >= since_day]
+        if len(recent) < len(records) // 2:
+            # Más de la mitad caducado: se reescribe el fichero solo con lo vigente
+            tmp_path = f"{self.path}.tmp"
+            recent.tofile(tmp_path)
+            os.replace(tmp_path, self.path)
+        return recent["fingerprint"].tolist()
+
+    def _persist(self, fingerprints, day):
+        records = np.empty(len(fingerprints), dtype=RECORD)
+        records["fingerprint"] = fingerprints
+        records["day"] = day
+        with open(self.path, "ab") as f:
+            f.write(records.tobytes())
+
+    def _load_pending(self):
+        if not os.path.exists(self.pending_path):
+            return []
+        with open(self.pending_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _persist_pending(self, articles):
+        tmp_path = f"{self.pending_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(articles, f, ensure_ascii=False)
+        os.replace(tmp_path, self.pending_path)
+
+
+def _signed(fp):
+    # Firestore guarda enteros de 64 bits con signo
+    return fp - 2 ** 64 if fp >= 2 ** 63 else fp
+
+
+class FirestoreSeenStore(SeenStore):
+    """
+    Huellas en Firestore: un documento por día con la lista de huellas. Las
+    noticias pendientes van en su propia colección, un documento por noticia.
+    """
+
+    def __init__(self, db=None, collection_name="news_agent_seen", retention_days=None):
+        if db is None:
+            from news_agent.providers import get_firestore_client
+            db = get_firestore_client()
+        self.db = db
+        self.collection_ref = db.collection(collection_name)
+        self.pending_ref = db.collection(f"{collection_name}_pending")
+        self._pending_ids = set()
+        super().__init__(retention_days)
+
+    def _load(self, since_day):
+        with span("firestore.query"):
+            docs = self.collection_ref.where("day", ">=", since_day).stream()
+            return [fp % 2 ** 64 for doc in docs for fp in doc.to_dict().get("fingerprints", [])]
+
+    def _persist(self, fingerprints, day):
+        from google.cloud import firestore
+
+        with span("firestore.commit"):
+            self.collection_ref.document(str(day)).set(
+                {"day": day, "fingerprints": firestore.ArrayUnion([_signed(fp) for fp in fingerprints])},
+                merge=True
+            )
+
+    def _load_pending(self):
+        with span("firestore.query"):
+            docs = list(self.pending_ref.stream())
+        self._pending_ids = {doc.id for doc in docs}
+        return sorted((doc.to_dict() for doc in docs), key=lambda article: article.get("held_at", 0))
+
+    def _persist_pending(self, articles):
+        docs = {f"{fingerprint('url', canonical_url(article.get('url'))):016x}": article for article in articles}
+        batch = self.db.batch()
+        for doc_id in self._pending_ids - set(docs):
+            batch.delete(self.pending_ref.document(doc_id))
+        for doc_id, article in docs.items():
+            batch.set(self.pending_ref.document(doc_id),
+                      dict(article, text=(article.get("text") or "")[:MAX_PENDING_TEXT_CHARS]))
+        with span("firestore.commit"):
+            batch.commit()
+        self._pending_ids = set(docs)
+
+
+def open_seen_store(db=None):
+    """Almacén de noticias vistas según SEEN_STORE ("local" o "firestore")."""
+    backend = os.environ.get("SEEN_STORE", "local").lower()
+    if backend == "firestore":
+        return FirestoreSeenStore(db=db)
+    if backend != "local":
+        logging.warning(f"SEEN_STORE='{backend}' no válido, se usa el fichero local.")
+    return LocalSeenStore()
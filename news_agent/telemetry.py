@@ -0,0 +1,255 @@
+"""
+Trazas y métricas de una ejecución.
+
+- span(nombre): mide un bloque (llamada externa, herramienta ADK...) y lo agrega
+  por (etapa, nombre): número de llamadas, errores, tiempo total y máximo.
+- stage(nombre): marca la etapa actual del pipeline (contextvar); los spans y
+  contadores se atribuyen a ella. bind_stage() la traslada a otros hilos.
+- count() y record_usage(): contadores, p. ej. los tokens de usage_metadata.
+- write_report(): al final de la ejecución escribe un informe compacto en
+  NEWS_AGENT_METRICS_PATH: JSON Lines (una línea por ejecución) o, si la ruta
+  termina en .prom/.txt, texto OpenMetrics.
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+DEFAULT_STAGE = "main"
+USAGE_FIELDS = {
+    "prompt_token_count": "prompt",
+    "candidates_token_count": "output",
+    "thoughts_token_count": "thoughts",
+    "cached_content_token_count": "cached",
+    "tool_use_prompt_token_count": "tool_prompt",
+}
+
+_stage = contextvars.ContextVar("news_agent_stage", default=DEFAULT_STAGE)
+
+
+class Telemetry:
+    """Agregados de spans y contadores de la ejecución en curso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.run_id = uuid.uuid4().hex[:12]
+            self.started_at = time.time()
+            self._start = time.monotonic()
+            self.spans = {}
+            self.counters = {}
+
+    def record_span(self, stage_name, name, seconds, error=False):
+        with self._lock:
+            stats = self.spans.setdefault((stage_name, name), {"count": 0, "errors": 0, "total_s": 0.0, "max_s": 0.0})
+            stats["count"] += 1
+            stats["errors"] += int(error)
+            stats["total_s"] += seconds
+            stats["max_s"] = max(stats["max_s"], seconds)
+
+    def add(self, stage_name, name, value, labels=None):
+        key = (stage_name, name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def report(self):
+        """Informe de la ejecución como dict serializable."""
+        with self._lock:
+            spans = [
+                {"stage": stage_name, "name": name, **stats,
+                 "total_s": round(stats["total_s"], 4), "max_s": round(stats["max_s"], 4)}
+                for (stage_name, name), stats in sorted(self.spans.items())
+            ]
+            counters = [
+                {"stage": stage_name, "name": name, **dict(labels), "value": value}
+                for (stage_name, name, labels), value in sorted(self.counters.items())
+            ]
+        return {
+            "run_id": self.run_id,
+            "started_at": datetime.fromtimestamp(self.started_at, tz=timezone.utc).isoformat(),
+            "duration_s": round(time.monotonic() - self._start, 3),
+            "spans": spans,
+            "counters": counters,
+        }
+
+    def openmetrics(self):
+        """El informe en formato de texto OpenMetrics."""
+        report = self.report()
+        lines = [
+            "# TYPE news_agent_span_seconds summary",
+            "# HELP news_agent_span_seconds Duration of instrumented calls per stage.",
+        ]
+        for span in report["spans"]:
+            labels = _labels(stage=span["stage"], name=span["name"])
+            lines.append(f"news_agent_span_seconds_count{labels} {span['count']}")
+            lines.append(f"news_agent_span_seconds_sum{labels} {span['total_s']}")
+        lines.append("# TYPE news_agent_span_errors counter")
+        for span in report["spans"]:
+            lines.append(f"news_agent_span_errors_total{_labels(stage=span['stage'], name=span['name'])} {span['errors']}")
+        names = sorted({counter["name"] for counter in report["counters"]})
+        for name in names:
+            metric = f"news_agent_{name}"
+            lines.append(f"# TYPE {metric} counter")
+            for counter in report["counters"]:
+                if counter["name"] == name:
+                    labels = {k: v for k, v in counter.items() if k not in ("name", "value")}
+                    lines.append(f"{metric}_total{_labels(**labels)} {counter['value']}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(**labels):
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+telemetry = Telemetry()
+
+
+def current_stage():
+    return _stage.get()
+
+
+@contextmanager
+def stage(name):
+    """Atribuye a la etapa 'name' los spans y contadores del bloque."""
+    token = _stage.set(name)
+    try:
+        yield
+    finally:
+        _stage.reset(token)
+
+
+def bind_stage(func):
+    """Devuelve 'func' para ejecutarse en otro hilo conservando la etapa actual."""
+    stage_name = _stage.get()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with stage(stage_name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def span(name):
+    """Mide el bloque como una llamada 'name' de la etapa actual; las excepciones cuentan como error."""
+    start = time.monotonic()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        telemetry.record_span(_stage.get(), name, time.monotonic() - start, error=error)
+
+
+def traced(name=None, as_stage=False):
+    """
+    Decorador: cada llamada a la función es un span (por defecto con su nombre).
+    Con as_stage=True las llamadas internas se atribuyen además a una etapa con ese nombre.
+    """
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                if not as_stage:
+                    return func(*args, **kwargs)
+                with stage(span_name):
+                    return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, value=1, **labels):
+    telemetry.add(_stage.get(), name, value, labels)
+
+
+def record_usage(source, model=None):
+    """Suma como contadores los tokens del usage_metadata de una respuesta o evento (si lo tiene)."""
+    usage = getattr(source, "usage_metadata", None)
+    if usage is None:
+        return
+    for field, kind in USAGE_FIELDS.items():
+        value = getattr(usage, field, None)
+        if value:
+            count("genai_tokens", value, kind=kind, **({"model": model} if model else {}))
+
+
+class _TracedModels:
+    def __init__(self, models):
+        self._models = models
+
+    def generate_content(self, *, model, contents, config=None, **kwargs):
+        with span("genai.generate_content"):
+            response = self._models.generate_content(model=model, contents=contents, config=config, **kwargs)
+        record_usage(response, model)
+        return response
+
+    def generate_content_stream(self, *, model, contents, config=None, **kwargs):
+        last = None
+        with span("genai.generate_content_stream"):
+            for chunk in self._models.generate_content_stream(model=model, contents=contents, config=config, **kwargs):
+                last = chunk
+                yield chunk
+        # El último trozo trae el uso de toda la respuesta
+        record_usage(last, model)
+
+    def embed_content(self, *, model, contents, config=None, **kwargs):
+        with span("genai.embed_content"):
+            response = self._models.embed_content(model=model, contents=contents, config=config, **kwargs)
+        count("genai_embedded_texts", 1 if isinstance(contents, str) else len(contents), model=model)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self._models, name)
+
+
+class TracedGenAIClient:
+    """Envoltorio de genai.Client que mide cada llamada a 'models' y cuenta los tokens usados."""
+
+    def __init__(self, client):
+        self.client = client
+        self.models = _TracedModels(client.models)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+def write_report(path=None):
+    """
+    Escribe el informe de la ejecución en 'path' (NEWS_AGENT_METRICS_PATH).
+    Sin ruta solo se resume en el log. Devuelve el informe.
+    """
+    report = telemetry.report()
+    path = path or os.environ.get("NEWS_AGENT_METRICS_PATH")
+    calls = sum(span["count"] for span in report["spans"])
+    tokens = sum(c["value"] for c in report["counters"]
+                 if c["name"] == "genai_tokens" and c["kind"] in ("prompt", "output", "thoughts"))
+    logging.info(f"Telemetría: {calls} llamadas instrumentadas, {tokens} tokens, {report['duration_s']}s.")
+    if not path:
+        return report
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if path.endswith((".prom", ".txt")):
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(telemetry.openmetrics())
+        else:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(report, ensure_ascii=False) + "\n")
+        logging.info(f"Informe de métricas escrito en {path}")
+    except OSError as e:
+        logging.warning(f"No se pudo escribir el informe de métricas en {path}: {e}")
+    return report
@@ -0,0 +1,83 @@
+import logging
+import threading
+
+import numpy as np
+
+
+class LocalVectorIndex:
+    """
+    Copia local en memoria de los embeddings de temas.
+    Guarda los vectores normalizados en una matriz NumPy y resuelve el top-k
+    por similitud coseno exacta, sin red.
+    """
+
+    def __init__(self, dimension=768):
+        self.dimension = dimension
+        self.topics = []
+        self._matrix = np.empty((64, dimension), dtype=np.float32)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.topics)
+
+    @classmethod
+    def from_collection(cls, collection_ref, dimension=768):
+        """Carga todos los temas con embedding de una colección de Firestore."""
+        index = cls(dimension=dimension)
+        topics, embeddings = [], []
+        for doc in collection_ref.select(["topic", "embedding"]).stream():
+            data = doc.to_dict()
+            if data.get("topic") and data.get("embedding") is not None:
+                topics.append(data["topic"])
+                embeddings.append(list(data["embedding"]))
+        index.add(topics, embeddings)
+        logging.info(f"Índice vectorial local cargado con {len(index)} temas.")
+        return index
+
+    def add(self, topics, embeddings):
+        """Añade temas y sus embeddings al índice."""
+        if not topics:
+            return
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(topics), -1))
+        with self._lock:
+            size = len(self.topics)
+            if size == 0 and vectors.shape[1] != self.dimension:
+                self.dimension = vectors.shape[1]
+                self._matrix = np.empty((self._matrix.shape[0], self.dimension), dtype=np.float32)
+            needed = size + len(topics)
+            if needed > self._matrix.shape[0]:
+                grown = np.empty((max(needed, 2 * self._matrix.shape[0]), self.dimension), dtype=np.float32)
+                grown[:size] = self._matrix[:size]
+                self._matrix = grown
+            self._matrix[size:needed] = vectors
+            self.topics.extend(topics)
+
+    def search(self, query_embeddings, limit=5, threshold=None):
+        """
+        Busca los temas más similares para uno o varios embeddings.
+        Devuelve, por cada consulta, una lista de (tema, similitud) ordenada de mayor a menor.
+        """
+        queries = _normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        with self._lock:
+            size = len(self.topics)
+            if size == 0:
+                return [[] for _ in range(len(queries))]
+            scores = queries @ self._matrix[:size].T
+            topics = self.topics[:size]
+
+        k = min(limit, size)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in zip(scores, top):
+            ordered = candidates[np.argsort(-row[candidates])]
+            results.append([
+                (topics[j], float(row[j])) for j in ordered
+                if threshold is None or row[j] >= threshold
+            ])
+        return results
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms